@@ -3,13 +3,31 @@
 import os
 import re
 import json
+import hashlib
+import threading
 import requests
 from dotenv import load_dotenv
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Tuple
+from typing import Callable, Iterable, Tuple
 import firebase_admin
 from firebase_admin import credentials, firestore
 from rag.vector_store_qdrant import ThreatRAG  
+from llm_cache import CLASSIFICATION_FIELDS, get_chunk_cache, get_template_cache
+from llm_client import CallRecord, chat_completion, stream_chat_completion
+from log_chunks import LogChunk
+from log_classify import classify_logs_with_llm
+from log_clusters import cluster_near_duplicates, expand_cluster_results
+from log_sort import sort_log_lines
+from log_templates import TemplateMiner, collapse_lines, event_template, expand_classifications, mine_templates
+from log_triage import group_scores, triage
+from log_windows import LogWindow, split_time_windows
+from prompt_compression import PROMPT_COMPRESSION, PromptCompressor
+from redaction import Redactor
+from report_sections import SectionStream
+from timestamps import split_label
+from token_budget import PromptTooLarge, check_request, count_tokens_lines, model_limits, pack_prompt, warm_tokenizer
 
 
 load_dotenv()
@@ -18,34 +36,111 @@ API_KEY = os.getenv("GROQ_API_KEY")
 if not API_KEY:
     raise EnvironmentError("❌ GROQ_API_KEY not set. Please add it in Render environment variables.")
 
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+# Load the counting tokenizer now, not inside the first request
+warm_tokenizer()
+
+# Completion tokens reserved for the 8-section report
+ANALYSIS_MAX_TOKENS = 30000
+
+# Shown for scores reused from the template cache, which keeps no justification
+REUSED_JUSTIFICATION = "Score reused from an earlier classification of this event template."
+
+# Map-reduce analysis: completion tokens per window report, concurrent window
+# calls, room left in each window prompt for its header, and how many window
+# reports are kept for reuse
+MAP_MAX_TOKENS = 4000
+ANALYSIS_WORKERS = int(os.getenv("FORENSIQ_ANALYSIS_WORKERS", "4"))
+WINDOW_PROMPT_MARGIN = 512
+WINDOW_CACHE_SIZE = 256
+_window_cache: OrderedDict[str, str] = OrderedDict()
+_window_cache_lock = threading.Lock()
 
 # --- Feature 1: Log Preprocessing and Timeline Generator ---
 def preprocess_logs(log_text: str) -> str:
-    lines = log_text.strip().split('\n')
-    lines.sort()  # Assumes logs begin with timestamp
-    return '\n'.join(lines)
+    # Merges the per-file runs by parsed timestamp instead of string-sorting
+    # "[filename] ..." lines; the app preprocesses with parallel_preprocess
+    return '\n'.join(sort_log_lines(log_text.strip().split('\n')))
 
 # --- Feature 2: PII Anonymization (Safe Mode) ---
 def anonymize_logs(log_text: str) -> str:
-    log_text = re.sub(r'\b(?:\d{1,3}\.){3}\d{1,3}\b', '[IP_REDACTED]', log_text)
-    log_text = re.sub(r'user "?[\w\-]+"?', '[USER]', log_text, flags=re.IGNORECASE)
-    log_text = re.sub(r'[a-zA-Z]:\\(?:[^\\\n]+\\)*[^\\\n]+', '[FILE_PATH]', log_text)
-    return log_text
+    return Redactor().redact(log_text)
 
 # --- Feature 3: Log Type Detection ---
-def detect_log_type(log_text: str) -> str:
-    if "powershell" in log_text.lower():
-        return "Windows Event Log"
-    elif "iptables" in log_text.lower() or "deny" in log_text.lower():
-        return "Firewall Log"
-    elif "auth" in log_text.lower() or "login" in log_text.lower():
-        return "Authentication Log"
-    else:
+# Lines sampled from the head of each source; detection cost does not grow with file size
+LOG_TYPE_SAMPLE = 200
+
+# Signatures per type, in priority order (earlier types win ties)
+LOG_TYPE_SIGNATURES = {
+    "Windows Event Log": ["powershell", "eventid", "event id", "winlogon", "sysmon", "security-auditing", "hklm\\", ".exe"],
+    "Firewall Log": ["iptables", "deny", "denied", "blocked", "firewall", "ufw", "src=", "dst=", "dpt=", "dropped"],
+    "Authentication Log": ["auth", "login", "logon", "sshd", "password", "pam_unix", "sudo", "credential"],
+    "Web Server Log": ["get /", "post /", "http/1.", "http/2", "user-agent", "nginx", "apache"],
+    "IDS / SIEM Alert Log": ["wazuh", "snort", "suricata", "ossec", "\"rule\":", "signature"],
+    "Application Log": ["exception", "traceback", "stack trace", " error ", " warn ", "timeout"],
+}
+_LOG_TYPE_NAMES = list(LOG_TYPE_SIGNATURES)
+# All signatures in one alternation, one named group per type, so each sampled line is scanned once
+_LOG_TYPE_RE = re.compile("|".join(
+    f"(?P<t{i}>" + "|".join(re.escape(sig) for sig in sigs) + ")"
+    for i, sigs in enumerate(LOG_TYPE_SIGNATURES.values())
+))
+
+
+def detect_source_type(sample_lines: Iterable[str]) -> tuple[str, int]:
+    # (log type, confidence %) where confidence is the share of sampled lines
+    # carrying a signature of the winning type
+    line_hits = [0] * len(_LOG_TYPE_NAMES)
+    sampled = 0
+    for line in sample_lines:
+        sampled += 1
+        hit_types = {int(m.lastgroup[1:]) for m in _LOG_TYPE_RE.finditer(line.lower())}
+        for t in hit_types:
+            line_hits[t] += 1
+
+    best = max(range(len(line_hits)), key=lambda t: (line_hits[t], -t)) if sampled else 0
+    if not sampled or not line_hits[best]:
+        return "Unknown Log Type", 0
+    return _LOG_TYPE_NAMES[best], round(100 * line_hits[best] / sampled)
+
+
+def detect_log_types(log_lines: Iterable[str], sample_size: int = LOG_TYPE_SAMPLE) -> dict[str | None, tuple[str, int]]:
+    # Per-source types from the first sample_size lines of each source
+    samples: dict[str | None, list[str]] = {}
+    for line in log_lines:
+        source, text = split_label(line)
+        sample = samples.setdefault(source, [])
+        if len(sample) < sample_size:
+            sample.append(text)
+    return {source: detect_source_type(sample) for source, sample in samples.items()}
+
+
+def describe_log_types(source_types: dict[str | None, tuple[str, int]]) -> str:
+    # Single label for the prompt: the type itself when all sources agree,
+    # otherwise each type with the sources it was detected in
+    by_type: dict[str, list[str]] = {}
+    for source, (log_type, _) in source_types.items():
+        by_type.setdefault(log_type, []).append(source or "logs")
+    if not by_type:
         return "Unknown Log Type"
+    if len(by_type) == 1:
+        return next(iter(by_type))
+    return "Mixed: " + "; ".join(f"{t} ({', '.join(sources)})" for t, sources in by_type.items())
+
+
+def detect_log_type(log_text: str) -> str:
+    return detect_log_type_lines(log_text.splitlines())
+
+def detect_log_type_lines(log_lines: Iterable[str]) -> str:
+    return describe_log_types(detect_log_types(log_lines))
 
 # --- Feature 4: Core LLM Log Analysis + Risk Score ---
-def analyze_logs(log_text: str, log_type: str, rag_context: str = "") -> Tuple[str, dict]:
+def analyze_logs(log_text: str, log_type: str, rag_context: str = "", feedback_notes: str = "",
+                 map_reduce: bool | None = None, line_values: list[float] | None = None,
+                 on_section: Callable[[str, str], None] | None = None) -> Tuple[str, dict]:
+    # map_reduce: None picks map-reduce only when the logs do not fit one prompt.
+    # line_values: priority per line when logs must be cut; local triage if None.
+    # on_section: streaming mode; called with (title, body) as soon as each
+    # section of the report has been generated, before the whole report is done.
     if not log_text.strip():
         return "No logs provided.", {}
     if not rag_context:
@@ -109,6 +204,11 @@ Logs:
 """
 
 
+    # Shorter notation for labels, timestamps and redaction runs, undone on the result
+    compressor = PromptCompressor() if PROMPT_COMPRESSION else None
+    prompt_lines = compressor.compress_lines(log_text.splitlines()) if compressor else log_text.splitlines()
+    notation = f"{compressor.legend()}\n\n" if compressor else ""
+
     payload = {
         "model": "llama-3.3-70b-versatile",
         "messages": [
@@ -152,42 +252,298 @@ Logs:
 
                 )
             },
-            {"role": "user", "content": f"Log Type: {log_type}\n\nLogs:\n{log_text}"}
+            {"role": "user", "content": f"Log Type: {log_type}\n\n{notation}Logs:\n"}
         ],
         "temperature": 0.1,  # Makes it more deterministic
-        "max_tokens": 30000   # Safer than 12000
+        "max_tokens": ANALYSIS_MAX_TOKENS
+
+    }
 
+    # Fit feedback, threat context and logs into the model's context window
+    # before sending; an oversized request is refused here, not by the provider
+    try:
+        packed = pack_prompt(payload["messages"], prompt_lines, rag_context=rag_context,
+                             feedback_notes=feedback_notes, max_output=ANALYSIS_MAX_TOKENS,
+                             values=line_values or triage(log_text.splitlines()).scores)
+    except PromptTooLarge as e:
+        print("[TOKENS]", e)
+        return f"Error: {e}", {}
+
+    user_content = f"Log Type: {log_type}\n\n"
+    if packed.feedback_notes:
+        user_content += f"{packed.feedback_notes}\n\n"
+    if packed.rag_context:
+        user_content += f"=== THREAT INTELLIGENCE (from MITRE ATT&CK) ===\n{packed.rag_context}\n\n"
+    payload["messages"][1]["content"] = user_content + notation + "Logs:\n" + "\n".join(packed.logs)
+
+    if map_reduce or (map_reduce is None and packed.report["logs_dropped"]):
+        return analyze_logs_map_reduce(log_text.splitlines(), log_type, payload["messages"][0],
+                                       rag_context=rag_context, feedback_notes=feedback_notes,
+                                       on_section=on_section)
+
+    calls = []
+    if on_section:
+        result, error = _stream_report(payload, on_section, compressor, on_record=calls.append)
+    else:
+        result, error = _request_report(payload, on_record=calls.append)
+    if error:
+        return error, {}
+    if compressor:
+        result = compressor.restore(result)
+    audit_entry = {
+        "log_type": log_type,
+        "timestamp": datetime.now().isoformat(),
+        "confidence": "Extract from LLM result manually if needed",
+        "token_budget": packed.report,
+        **_latency_audit(calls[-1] if calls else None)
     }
+    return result, audit_entry
 
-    API_KEY = os.getenv("GROQ_API_KEY")
-    if not API_KEY:
-        raise EnvironmentError("❌ GROQ_API_KEY not set. Please add it in Render environment variables.")
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
+def _latency_audit(call: CallRecord | None) -> dict:
+    # Latency of the call that produced the report
+    return {
+        "llm_latency_seconds": round(call.latency, 2) if call else None,
+        "llm_first_token_seconds": round(call.first_token, 2) if call and call.first_token is not None else None
     }
 
 
-    response = requests.post(GROQ_URL, headers=headers, json=payload)
+def _request_report(payload: dict,
+                    on_record: Callable[[CallRecord], None] | None = None) -> tuple[str | None, str | None]:
+    # (report text, None) on success, (None, error message) otherwise
+    try:
+        response = chat_completion(payload, on_record=on_record)
+    except requests.RequestException as e:
+        print("API request failed:", e)
+        return None, f"Error: {e}"
 
     if response.status_code == 200:
         try:
             data = response.json()
-            result = data["choices"][0]["message"]["content"]
-            audit_entry = {
-                "log_type": log_type,
-                "timestamp": datetime.now().isoformat(),
-                "confidence": "Extract from LLM result manually if needed"
-            }
-            return result, audit_entry
+            return data["choices"][0]["message"]["content"], None
         except Exception as e:
             print("LLM response parse error:", e)
             print("Raw response text:", response.text)
-            return "LLM returned an invalid response.", {}
+            return None, "LLM returned an invalid response."
     else:
         print("API error:", response.status_code, response.text)
-        return f"Error: {response.status_code} - {response.text}", {}
+        return None, f"Error: {response.status_code} - {response.text}"
+
+
+def _stream_report(payload: dict, on_section: Callable[[str, str], None],
+                   compressor: PromptCompressor | None = None,
+                   on_record: Callable[[CallRecord], None] | None = None) -> tuple[str | None, str | None]:
+    # _request_report over the provider's token stream: each section is handed
+    # to on_section (notation already restored) the moment the next one starts
+    parser = SectionStream()
+    parts = []
+
+    def emit(sections):
+        for title, body in sections:
+            on_section(title, compressor.restore(body) if compressor else body)
+
+    try:
+        for text in stream_chat_completion(payload, on_record=on_record):
+            parts.append(text)
+            emit(parser.feed(text))
+    except requests.HTTPError as e:
+        print("API error:", e.response.status_code, e.response.text)
+        return None, f"Error: {e.response.status_code} - {e.response.text}"
+    except (requests.RequestException, ValueError) as e:
+        print("API request failed:", e)
+        return None, f"Error: {e}"
+    emit(parser.close())
+    return "".join(parts), None
+
+
+# --- Feature 4b: Map-reduce analysis for incidents larger than one context ---
+def _window_report(window: LogWindow, lines: list[str], number: int, total: int, log_type: str,
+                   system_message: dict, feedback_notes: str, notation: str) -> tuple[str | None, str | None, bool]:
+    # Partial 8-section report for one window (lines as sent, possibly
+    # compressed), reused while the lines, notation, log type and feedback are
+    # unchanged. Returns (report, error, reused).
+    key = hashlib.sha256(
+        "\0".join(["\n".join(lines), notation, log_type, feedback_notes]).encode("utf-8")).hexdigest()
+    with _window_cache_lock:
+        if key in _window_cache:
+            _window_cache.move_to_end(key)
+            return _window_cache[key], None, True
+
+    user_content = (
+        f"Log Type: {log_type}\n\n"
+        f"These logs are time window {number} of {total} ({window.label()}) of a larger incident. "
+        "Report only on what these logs show; other windows are analyzed separately.\n\n"
+    )
+    if feedback_notes:
+        user_content += f"{feedback_notes}\n\n"
+    payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [system_message, {"role": "user", "content": user_content + notation + "Logs:\n" + "\n".join(lines)}],
+        "temperature": 0.1,
+        "max_tokens": MAP_MAX_TOKENS
+    }
+    try:
+        check_request(payload["messages"], MAP_MAX_TOKENS)
+    except PromptTooLarge as e:
+        return None, f"Error: {e}", False
+
+    report, error = _request_report(payload)
+    if report is not None:
+        with _window_cache_lock:
+            _window_cache[key] = report
+            _window_cache.move_to_end(key)
+            while len(_window_cache) > WINDOW_CACHE_SIZE:
+                _window_cache.popitem(last=False)
+    return report, error, False
+
+
+def analyze_logs_map_reduce(log_lines: list[str], log_type: str, system_message: dict, rag_context: str = "",
+                            feedback_notes: str = "", workers: int = ANALYSIS_WORKERS,
+                            on_section: Callable[[str, str], None] | None = None) -> Tuple[str, dict]:
+    # Map: one partial report per time window, at most `workers` in flight.
+    # Reduce: one call merging the partial reports into the 8-section report,
+    # streamed to on_section when given.
+    limits = model_limits()
+    overhead = check_request([system_message, {"role": "user", "content": feedback_notes}], MAP_MAX_TOKENS)
+    windows = split_time_windows(log_lines, limits.context - MAP_MAX_TOKENS - overhead - WINDOW_PROMPT_MARGIN)
+    print(f"[MAP-REDUCE] Analyzing {len(log_lines)} lines in {len(windows)} windows")
+
+    # One notation across all windows, so partial reports agree on aliases and T0
+    compressor = PromptCompressor() if PROMPT_COMPRESSION else None
+    prompt_lines = compressor.compress_lines(log_lines) if compressor else log_lines
+    notation = f"{compressor.legend()}\n\n" if compressor else ""
+    window_lines = []
+    start = 0
+    for window in windows:
+        window_lines.append(prompt_lines[start:start + len(window.lines)])
+        start += len(window.lines)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(windows)))) as pool:
+        # map() yields results in window order
+        partials = list(pool.map(
+            lambda args: _window_report(args[1], window_lines[args[0] - 1], args[0], len(windows), log_type,
+                                        system_message, feedback_notes, notation),
+            enumerate(windows, start=1)))
+
+    # Each partial report stays whole: the reduce prompt takes reports, never
+    # single lines of one
+    reports = []
+    failed = []
+    for number, (window, (report, error, _)) in enumerate(zip(windows, partials), start=1):
+        if report is None:
+            print(f"[MAP-REDUCE] Window {number} failed: {error}")
+            failed.append(f"{number} ({window.label()})")
+            continue
+        reports.append(f"=== WINDOW {number} OF {len(windows)}: {window.label()} ===\n{report.strip()}")
+    if not reports:
+        return "Error: no time window could be analyzed.", {}
+
+    reduce_header = (
+        f"Log Type: {log_type}\n\n"
+        f"The logs of this incident were analyzed in {len(windows)} consecutive time windows. "
+        "Merge the partial reports below into ONE report with the same 8 sections: combine the timelines "
+        "in chronological order, reconcile the root causes into a single explanation, total the impact "
+        "without double counting, and keep every per-event risk score, confidence and contributing log.\n"
+    )
+    if failed:
+        reduce_header += f"Windows that could not be analyzed (list them under MISSING CONTEXT OR DATA): {', '.join(failed)}\n"
+    payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [system_message, {"role": "user", "content": reduce_header + "\n" + notation + "Partial reports:\n"}],
+        "temperature": 0.1,
+        "max_tokens": ANALYSIS_MAX_TOKENS
+    }
+    # Too many reports for one prompt: merge neighbours into combined partial
+    # reports, level by level, until they all fit
+    levels = 0
+    while True:
+        try:
+            packed = pack_prompt(payload["messages"], reports, rag_context=rag_context,
+                                 feedback_notes=feedback_notes, max_output=ANALYSIS_MAX_TOKENS)
+        except PromptTooLarge as e:
+            print("[TOKENS]", e)
+            return f"Error: {e}", {}
+        if not packed.report["logs_dropped"]:
+            break
+        merged = _merge_reports(reports, len(windows), log_type, system_message, notation, workers)
+        if len(merged) == len(reports):
+            print(f"[MAP-REDUCE] Could not merge further; {packed.report['logs_dropped']} partial reports left out")
+            break
+        reports = merged
+        levels += 1
+
+    user_content = reduce_header + "\n"
+    if packed.feedback_notes:
+        user_content += f"{packed.feedback_notes}\n\n"
+    if packed.rag_context:
+        user_content += f"=== THREAT INTELLIGENCE (from MITRE ATT&CK) ===\n{packed.rag_context}\n\n"
+    payload["messages"][1]["content"] = user_content + notation + "Partial reports:\n" + "\n".join(packed.logs)
+
+    calls = []
+    if on_section:
+        result, error = _stream_report(payload, on_section, compressor, on_record=calls.append)
+    else:
+        result, error = _request_report(payload, on_record=calls.append)
+    if error:
+        return error, {}
+    if compressor:
+        result = compressor.restore(result)
+    reused = sum(1 for _, _, cached in partials if cached)
+    audit_entry = {
+        "log_type": log_type,
+        "timestamp": datetime.now().isoformat(),
+        "confidence": "Extract from LLM result manually if needed",
+        "token_budget": packed.report,
+        **_latency_audit(calls[-1] if calls else None),
+        "map_reduce": {"windows": len(windows), "windows_reused": reused, "windows_failed": len(failed),
+                       "merge_levels": levels}
+    }
+    return result, audit_entry
+
+
+def _merge_reports(reports: list[str], total: int, log_type: str, system_message: dict, notation: str,
+                   workers: int = ANALYSIS_WORKERS) -> list[str]:
+    # One reduce level: consecutive partial reports are grouped up to what fits
+    # one prompt and each group of two or more is merged into one partial
+    # report. A group whose merge fails is passed on unmerged.
+    header = (
+        f"Log Type: {log_type}\n\n"
+        f"The partial reports below cover consecutive time windows (of {total}) of a larger incident. "
+        "Merge them into ONE partial report with the same 8 sections: combine the timelines in chronological "
+        "order, total the impact without double counting, and keep every per-event risk score, confidence "
+        "and contributing log. Start it with a line naming the windows it covers, as the reports below do. "
+        "Other windows are merged separately.\n\n"
+    )
+    overhead = check_request([system_message, {"role": "user", "content": header + notation}], MAP_MAX_TOKENS)
+    budget = model_limits().context - MAP_MAX_TOKENS - overhead - WINDOW_PROMPT_MARGIN
+
+    groups: list[list[str]] = []
+    used = budget
+    for report, cost in zip(reports, count_tokens_lines(reports)):
+        if used + cost + 1 > budget:
+            groups.append([])
+            used = 0
+        groups[-1].append(report)
+        used += cost + 1
+
+    def merge(group: list[str]) -> list[str]:
+        if len(group) < 2:
+            return group
+        payload = {
+            "model": "llama-3.3-70b-versatile",
+            "messages": [system_message, {"role": "user", "content": header + notation + "Partial reports:\n"
+                                          + "\n".join(group)}],
+            "temperature": 0.1,
+            "max_tokens": MAP_MAX_TOKENS
+        }
+        report, error = _request_report(payload)
+        if report is None:
+            print(f"[MAP-REDUCE] Merging {len(group)} partial reports failed: {error}")
+            return group
+        return [report.strip()]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as pool:
+        return [report for merged in pool.map(merge, groups) for report in merged]
 
 
 # --- Feature 5 and 6: Feedback & Audit Storage ---
@@ -198,94 +554,117 @@ except Exception as e:
     print("[WARN] Firebase unavailable:", e)
 
 
-def store_feedback(log_id, feedback, correction):
+def store_feedback(log_id, feedback, correction, chunk_ids=None):
     if not db:
         print("[WARN] Firebase DB unavailable. Feedback not saved.")
         return
     db.collection("feedback").add({
         "log_id": log_id,
+        "chunk_ids": chunk_ids or [],
         "feedback": feedback,
         "correction": correction,
         "timestamp": firestore.SERVER_TIMESTAMP
     })
-def store_audit_log(log_id, audit_data):
+def store_audit_log(log_id, audit_data, chunk_ids=None):
     if not db:
         print("[WARN] Firebase DB unavailable. Feedback not saved.")
         return
+    if chunk_ids is not None:
+        audit_data = {**audit_data, "chunk_ids": chunk_ids}
     db.collection("audit_logs").document(log_id).set(audit_data)
 
 
-def classify_logs_with_llm(log_lines: list[str]) -> list[dict]:
-    import os
-    import requests
-    import json
-
-    API_KEY = os.getenv("GROQ_API_KEY")
-    if not API_KEY:
-        raise EnvironmentError("❌ GROQ_API_KEY not set. Please add it in Render environment variables.")
-
-    GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-
-    # Batch prompt for ~100 logs
-    batched_prompt = """You are a cybersecurity log classifier.
-For each of the following logs, return a JSON object with:
-- log (original string)
-- risk_score (0–100)
-- risk_level (High, Medium, Low) based on score (>=70 = High, 40–69 = Medium, <40 = Low)
-- justification (short reason)
-- confidence (0–100)
-SCORING GUIDANCE:
-- Evaluate events **in their full context**, not in isolation.
-- Low-risk actions (e.g., successful logins, backups, configuration changes) should receive **higher risk scores** if they precede or correlate with downstream issues like failures, alerts, access denials, or anomalous behavior.
-- Analyze **sequences of events** — if a benign-looking log is the trigger for cascading failures, consider it a significant precursor.
-- Risk scores must reflect:
-  • Severity of the event
-  • Temporal proximity to other anomalies
-  • Repetition, frequency, or volume of similar events
-  • Anomalous user behavior (unexpected access, odd timing, privilege escalation)
-- Use statistical and behavioral inference to detect indirect contributors.
-- Do **not default to 0** unless an event is clearly unrelated and contextually irrelevant.
-- Justify each risk score briefly — especially when scoring events above or below what might be expected at first glance.
-CONFIDENCE SCORING:
-- Confidence values must reflect how strong the evidence is. Consider log clarity, repetition, direct cause-effect patterns, and absence of ambiguity.
-- Assign higher confidence when conclusions are directly supported by multiple consistent events. Lower it when logs are vague, missing, or indirectly inferred.
-
-Return a JSON array.
-
-Logs:
-""" + "\n".join([f"{i+1}. {log}" for i, log in enumerate(log_lines[:100])])
-
-    headers = {
-        "Authorization": f"Bearer {API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    payload = {
-        "model": "llama-3.3-70b-versatile",
-        "messages": [
-            {"role": "user", "content": batched_prompt}
-        ],
-        "temperature": 0.1,  # Makes it more deterministic
-        "max_tokens": 30000   # Safer than 12000
-
-    }
-
-    try:
-        res = requests.post(GROQ_URL, headers=headers, json=payload)
-        res.raise_for_status()
-        content = res.json()["choices"][0]["message"]["content"]
-
-        # Extract JSON block from the output
-        match = re.search(r"\[.*\]", content, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-            return json.loads(json_str)
-        else:
-            print("No JSON array found in Groq response.")
-            return []
-    except Exception as e:
-        print(f"[GROQ ERROR] {e}")
-        return []
+def cluster_templates(miner: TemplateMiner) -> list[list[int]]:
+    # Near-duplicate templates (free-text messages exact templating keeps apart)
+    return cluster_near_duplicates([template.text for template in miner.templates])
+
+
+def evidence_clusters(evidence: str, miner: TemplateMiner, clusters: list[list[int]]) -> list[list[int]]:
+    # Member line indices of every near-duplicate cluster the evidence text
+    # cites, so a single quoted line can be expanded to all the events it
+    # stands for
+    cited = []
+    for members in clusters:
+        templates = [miner.templates[i] for i in members]
+        if any(split_label(t.sample)[1].strip() in evidence for t in templates):
+            cited.append(sorted(i for t in templates for i in t.members))
+    return cited
+
+
+def classify_logs_by_template(log_lines: list[str], miner: TemplateMiner | None = None,
+                              clusters: list[list[int]] | None = None,
+                              scores: list[float] | None = None, use_template_cache: bool = True) -> list[dict]:
+    # Repeated events are classified once per template, and near-duplicate
+    # templates once per cluster; every member line then gets that score.
+    # Triage runs over every line, so a cluster ranks by its most anomalous event.
+    # Templates whose masked event template was classified before (in any
+    # incident) reuse that score without this incident's justification and are
+    # left out of their cluster; use_template_cache=False sends them all, for
+    # when a sequence's full context should weigh on every score.
+    miner = miner or mine_templates(log_lines)
+    clusters = clusters if clusters is not None else cluster_templates(miner)
+    representatives = collapse_lines(log_lines, miner)
+    scores = scores or triage(log_lines).scores
+    template_values = group_scores([t.members for t in miner.templates], scores)
+
+    cache = get_template_cache() if use_template_cache else None
+    keys = [event_template(t.sample) for t in miner.templates]
+    known = cache.get_many(keys) if cache else {}
+    if known:
+        reused = sum(key in known for key in keys)
+        print(f"[TEMPLATE CACHE] {reused} of {len(keys)} event templates already classified")
+    clusters = [unseen for unseen in ([t for t in members if keys[t] not in known] for members in clusters) if unseen]
+    cluster_values = group_scores(clusters, template_values)
+    cluster_lines = [representatives[members[0]] for members in clusters]
+
+    classified = classify_logs_with_llm(cluster_lines, cluster_values) if clusters else []
+    classified = expand_cluster_results(clusters, representatives, classified)
+    if cache and classified:
+        template_ids = {line: t for t, line in enumerate(representatives)}
+        cache.put_many({keys[template_ids[item["log"]]]: item for item in classified})
+    classified += [{"log": representatives[t], **{k: known[key].get(k) for k in CLASSIFICATION_FIELDS},
+                    "justification": REUSED_JUSTIFICATION}
+                   for t, key in enumerate(keys) if key in known]
+    return expand_classifications(miner, log_lines, classified)
+
+
+def classify_logs_by_chunk(log_lines: list[str], chunks: list[LogChunk], scores: list[float] | None = None,
+                           use_template_cache: bool = True) -> tuple[list[dict], int]:
+    # Reuses classifications of chunks seen before, in this or an earlier run
+    # (llm_cache.ChunkCache); the lines of new chunks are templated and
+    # classified together. Returns results in line order and the number of
+    # chunks reused. use_template_cache=False bypasses this cache too, since a
+    # cached chunk may hold template-reused scores.
+    cache = get_chunk_cache() if use_template_cache else None
+    results = cache.get_many([c.id for c in chunks]) if cache else {}
+    new_chunks = [c for c in chunks if c.id not in results]
+
+    if new_chunks:
+        new_lines = [line for c in new_chunks for line in log_lines[c.start:c.end]]
+        new_scores = [scores[i] for c in new_chunks for i in range(c.start, c.end)] if scores else None
+        miner = mine_templates(new_lines)
+        classified = classify_logs_by_template(new_lines, miner, scores=new_scores,
+                                               use_template_cache=use_template_cache)
+        by_template = {item["template_id"]: item for item in classified}
+
+        offset = 0
+        complete = {}
+        for chunk in new_chunks:
+            items = []
+            for j in range(offset, offset + chunk.end - chunk.start):
+                item = by_template.get(miner.assignments[j])
+                if item is not None:
+                    items.append({**item, "log": new_lines[j]})
+            offset += chunk.end - chunk.start
+            results[chunk.id] = items
+            # Only chunks with every line classified are kept; the rest are
+            # sent again next time
+            if len(items) == chunk.end - chunk.start:
+                complete[chunk.id] = items
+        if cache and complete:
+            cache.put_many(complete)
+
+    return [item for c in chunks for item in results[c.id]], len(chunks) - len(new_chunks)
 
 # def get_feedback_counts(filepath="feedback.json"):
 #     if not os.path.exists(filepath):
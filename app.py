@@ -3,7 +3,16 @@
 import streamlit as st
 import datetime
 import json
-from analyze_logs import classify_logs_with_llm, analyze_logs, preprocess_logs, anonymize_logs, detect_log_type, store_feedback, store_audit_log
+from analyze_logs import classify_logs_with_llm, classify_logs_by_chunk, cluster_templates, evidence_clusters, analyze_logs, detect_log_types, describe_log_types, LOG_TYPE_SAMPLE, store_feedback, store_audit_log
+from parallel_preprocess import preprocess_parallel
+from log_ingest import iter_upload_sources, iter_labeled_lines, iter_json_events, parse_json_event, assemble_records, is_content_line
+from llm_cache import get_cache
+from report_sections import parse_report, timeline_step
+from log_chunks import chunk_lines, chunk_overlap, corpus_id
+from log_reader import MappedLogFile, spool_lines
+from log_templates import mine_templates, collapse_lines
+from log_triage import triage, group_scores
+from timestamps import TimestampRecognizer, is_timestamp_only, match_format, timestamp_column
 # from streamlit_timeline import timeline # Comment out or remove this line
 import plotly.express as px # Import plotly.express
 import pandas as pd # Import pandas for DataFrame creation
@@ -208,6 +217,15 @@ with st.sidebar:
         st.markdown("<div style='line-height: 2.6'>Toggle Theme</div>", unsafe_allow_html=True)
 
     safe_mode = st.toggle("Safe Mode (Redact PII)", value=True)
+    reuse_templates = st.toggle(
+        "Reuse known event classifications", value=True,
+        help="Events whose template was classified in an earlier incident keep that score. "
+             "Turn off to score every event in the context of this sequence."
+    )
+    stream_report = st.toggle(
+        "Stream the report", value=True,
+        help="Show each section of the incident report as soon as it is written."
+    )
 
         
     st.markdown("---")
@@ -218,8 +236,14 @@ with st.sidebar:
 
     case_study_content = None
     if selected_case_study and selected_case_study != "-- None --":
-        with open(os.path.join(case_study_dir, selected_case_study), "r", encoding="utf-8") as f:
-            case_study_content = f.read()
+        case_study_path = os.path.join(case_study_dir, selected_case_study)
+        if selected_case_study.endswith(".json"):
+            with open(case_study_path, "rb") as case_file:
+                case_study_content = list(iter_json_events(case_file))
+        else:
+            with MappedLogFile(case_study_path) as case_file:
+                case_study_content = [record for record in assemble_records(case_file.iter_text())
+                                      if is_content_line(record)]
         st.success(f"📁 Loaded sample: {selected_case_study}")
 
     st.markdown("---")
@@ -303,69 +327,133 @@ if current_theme == "dark":
     """, unsafe_allow_html=True)
 
 # --- File Upload ---
-uploaded_files = st.file_uploader("📁 Upload One or More Log Files", type=["txt", "json"], accept_multiple_files=True)
+# Lines per page of the raw log viewer
+RAW_LOG_PAGE_LINES = 2000
+# Share of chunks another upload must have in common for its feedback to apply
+FEEDBACK_MIN_CHUNK_OVERLAP = 0.5
+uploaded_files = st.file_uploader("📁 Upload One or More Log Files", type=["txt", "json", "gz", "bz2", "xz", "zip"], accept_multiple_files=True)
 is_json_file = False
-combined_logs = ""
+combined_logs = []  # one record per log line, never joined into a single string
 import hashlib
+from array import array
+
+def upload_key(file):
+    # Cheap identity that stays the same across reruns of the same upload
+    return (getattr(file, "file_id", file.name), file.size)
 
-def file_signature(file):
-    content = file.read()
-    file.seek(0)
-    return hashlib.md5(content).hexdigest()
+# Content fingerprints are computed once per upload, chunk by chunk while it is ingested
+upload_fingerprints = st.session_state.setdefault("upload_fingerprints", {})
+current_keys = [upload_key(f) for f in uploaded_files] if uploaded_files else []
 
-current_signatures = [file_signature(f) for f in uploaded_files] if uploaded_files else []
+if uploaded_files:
+    if current_keys == st.session_state.get("prev_upload_keys") and "uploaded_logs" in st.session_state:
+        # Same uploads as the last run (theme toggle, slider move...): nothing to re-read
+        uploaded_logs = st.session_state["uploaded_logs"]
+        is_json_file = st.session_state.get("uploaded_is_json", False)
+        uploaded_log_types = st.session_state.get("uploaded_log_types", {})
+    else:
+        uploaded_log_types = {}
+        uploaded_sources = []
+
+        def ingest_uploads():
+            # Records of every upload, streamed straight into the on-disk spool
+            for uploaded_file in uploaded_files:
+                key = upload_key(uploaded_file)
+                hasher = None if key in upload_fingerprints else hashlib.md5()
+                try:
+                    # Compressed uploads are decompressed as a stream; zip members become separate sources
+                    for source_name, source in iter_upload_sources(uploaded_file, uploaded_file.name):
+                        uploaded_sources.append(source_name)
+                        # Stream each source in chunks; lines are labeled as they are decoded
+                        if source_name.endswith(".json"):
+                            # One compact line per JSON event instead of one per pretty-printed line
+                            records = iter_json_events(source, source_name, hasher=hasher)
+                        else:
+                            # Stack traces and continuation lines are folded into the record that opened them
+                            records = assemble_records(iter_labeled_lines(source, source_name, hasher=hasher))
+                        # Type each source from a fixed-size sample of its head
+                        sample = []
+                        for record in records:
+                            if len(sample) < LOG_TYPE_SAMPLE:
+                                sample.append(record)
+                            yield record
+                        uploaded_log_types.update(detect_log_types(sample))
+                    if hasher:
+                        upload_fingerprints[key] = hasher.hexdigest()
+                except Exception as e:
+                    st.error(f"Error reading {uploaded_file.name}: {e}")
+
+        # The corpus lives in a memory-mapped temporary file, not in session
+        # state; the previous upload's file is removed once it is replaced
+        previous_logs = st.session_state.pop("uploaded_logs", None)
+        if isinstance(previous_logs, MappedLogFile):
+            previous_logs.close()
+        uploaded_logs = spool_lines(ingest_uploads())
+        is_json_file = any(name.endswith(".json") for name in uploaded_sources)
+        st.session_state["uploaded_logs"] = uploaded_logs
+        st.session_state["uploaded_is_json"] = is_json_file
+        st.session_state["uploaded_log_types"] = uploaded_log_types
+        st.session_state["prev_upload_keys"] = current_keys
+
+current_signatures = [upload_fingerprints.get(key) for key in current_keys]
 previous_signatures = st.session_state.get("prev_uploaded", [])
 
 if "theme_changed" not in st.session_state or not st.session_state["theme_changed"]:
     if current_signatures != previous_signatures:
-        for key in ["log_data", "llm_result", "audit_data", "llm_classified", "combined_logs", "rag_context"]:
+        for key in ["log_data", "llm_result", "audit_data", "llm_classified", "combined_logs", "log_types", "rag_context"]:
             st.session_state.pop(key, None)
         st.session_state["prev_uploaded"] = current_signatures
 
-import re
-timestamp_patterns = [
-            re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[\+\-]\d{2}:\d{2})?)\s*[:,\-]?\s*(.+)"),
-            re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-            re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}):\s+(.+)"),
-            re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]\s+(.+)"),
-            re.compile(r"^([A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-            re.compile(r"^(\d{10})\s+(.+)"),
-            re.compile(r"^\[[^\]]+\]\s+(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-        ]
-def is_timestamp_only(line):
+def processed_corpus(logs, safe_mode):
+    # Sorting and Safe Mode run once per corpus/mode, not on every rerun; large
+    # corpora are fanned out across a process pool. The processed corpus is a
+    # mapped spool file plus one format code per line; session state keeps
+    # those and the redaction counts, and closes the previous corpus's file.
+    processing_key = (st.session_state.get("corpus_key"), safe_mode)
+    cached = st.session_state.get("processed_logs")
+    if cached and cached["key"] == processing_key:
+        return cached
+    if cached:
+        cached["lines"].close()
+    with st.spinner("Preprocessing logs..."):
+        processed = preprocess_parallel(logs, safe_mode)
+    cached = {"key": processing_key, "lines": processed.lines, "formats": processed.formats,
+              "redactions": processed.redactions if safe_mode else {}}
+    st.session_state["processed_logs"] = cached
+    return cached
+
+def cached_artifact(processed, name, build):
+    # Per-corpus results live next to the processed corpus in session state,
+    # so they are built once per processing key, not on every rerun
+    if name not in processed:
+        processed[name] = build()
+    return processed[name]
+
+def index_timestamps(lines, formats):
+    # Events to analyse (lines with more than a bare timestamp), the row of
+    # each event in the processed corpus, and the row of each event's text, so
+    # the timeline and evidence views read lines back from the mapped file.
+    # One pass, so a mapped file's lines are decoded once; only lines with a
+    # format code are matched, and with that one pattern.
+    log_lines = []
+    event_rows = array("L")
+    line_rows = {}
+    for row, (line, code) in enumerate(zip(lines, formats)):
         line = line.strip()
-        for pattern in timestamp_patterns:
-            match = pattern.match(line)
-            if match:
-                # Check if event/content part exists and is not just whitespace
-                if len(match.groups()) > 1 and match.group(2).strip():
-                    return False  # valid log with content
-                else:
-                    return True   # timestamp only
-        return False  # not a timestamp line
+        if line and not (code and is_timestamp_only(match_format(line, code))):
+            log_lines.append(line)
+            event_rows.append(row)
+            line_rows.setdefault(line, row)
+    return log_lines, event_rows, line_rows
 # Load either uploaded logs or case study fallback
 
 # 🧠 Use uploaded files if present
 if uploaded_files:
-    all_logs = []
-    for uploaded_file in uploaded_files:
-        try:
-            content = uploaded_file.read().decode("utf-8")
-            uploaded_file.seek(0)
-            lines = content.splitlines()
-            labeled_lines = [
-                f"[{uploaded_file.name}] {line}"
-                for line in lines
-                if line.strip() and line.strip() not in ("[", "]")
-            ]
-            all_logs.extend(labeled_lines)
-            if uploaded_file.name.endswith(".json"):
-                is_json_file = True
-        except Exception as e:
-            st.error(f"Error reading {uploaded_file.name}: {e}")
-    combined_logs = "\n".join(all_logs)
+    combined_logs = uploaded_logs
     st.session_state["combined_logs"] = combined_logs
     st.session_state["is_json_file"] = is_json_file
+    st.session_state["log_types"] = uploaded_log_types
+    st.session_state["corpus_key"] = ("upload", tuple(current_signatures))
 
 # 🧠 Or use sample if selected
 elif case_study_content:
@@ -373,6 +461,10 @@ elif case_study_content:
     is_json_file = selected_case_study.endswith(".json")
     st.session_state["combined_logs"] = combined_logs
     st.session_state["is_json_file"] = is_json_file
+    st.session_state["log_types"] = {
+        selected_case_study: detect_log_types(case_study_content[:LOG_TYPE_SAMPLE]).get(None, ("Unknown Log Type", 0))
+    }
+    st.session_state["corpus_key"] = ("case_study", selected_case_study)
 
 # 🧠 Or restore from session on theme switch
 elif "combined_logs" in st.session_state:
@@ -381,7 +473,7 @@ elif "combined_logs" in st.session_state:
 
 # ❌ Otherwise, clear everything
 elif not uploaded_files and not case_study_content and "combined_logs" not in st.session_state:
-    for key in ["combined_logs", "llm_result", "audit_data", "llm_classified", "rag_context"]:
+    for key in ["combined_logs", "log_types", "llm_result", "audit_data", "llm_classified", "rag_context"]:
         st.session_state.pop(key, None)
 
 
@@ -409,27 +501,17 @@ if not combined_logs and "combined_logs" in st.session_state:
     result = st.session_state.get("llm_result", "")
     
     # 👇 Force logs to be reparsed
-    log_type = detect_log_type(combined_logs)
-    logs = preprocess_logs(combined_logs)
-    if safe_mode:
-        logs = anonymize_logs(logs)
-
-    log_lines = [
-        line.strip()
-        for line in logs.splitlines()
-        if line.strip() and not is_timestamp_only(line)
-    ]
+    log_type = describe_log_types(st.session_state.get("log_types", {}))
+    # Same processed corpus as the main path below, from session state when it is there
+    processed = processed_corpus(combined_logs, safe_mode)
+    log_lines, event_rows, line_rows = cached_artifact(
+        processed, "events", lambda: index_timestamps(processed["lines"], processed["formats"]))
 
     from rag.vector_store_qdrant import ThreatRAG
     with st.expander("RAG Context Injected"):
-        log_lines = [
-            line.strip()
-            for line in logs.splitlines()
-            if line.strip() and not is_timestamp_only(line)
-        ]
         with st.spinner("🔍 Loading RAG Context..."):
             try:
-                threat_rag = ThreatRAG(log_lines)
+                threat_rag = ThreatRAG(log_lines, cached_artifact(processed, "line_chunks", lambda: chunk_lines(log_lines)))
                 rag_context = threat_rag.search(log_lines)
                 st.session_state["rag_context"] = rag_context  # ✅ Store it
             except Exception as e:
@@ -454,35 +536,67 @@ if combined_logs:
         st.session_state["theme_changed"] = False
         # st.stop() # This will stop execution and re-render with the restored data
 
-    import hashlib
-    log_id = f"log_{hashlib.md5(combined_logs[:5000].encode()).hexdigest()}"
-    combined_logs = combined_logs.strip()
-    if is_json_file:
-        try:
-            parsed = json.loads(combined_logs)
-            combined_logs = json.dumps(parsed, indent=2)
-        except Exception as e:
-            print(f"[JSON LOAD ERROR] {e}")
-
     # --- Process Logs ---
-    log_type = detect_log_type(combined_logs)
+    # Types are sampled per source at upload (or case study selection)
+    source_types = st.session_state.get("log_types", {})
+    log_type = describe_log_types(source_types)
     st.markdown(f"**Detected Log Type:** <span style='color:lightgreen; font-weight:bold'>{log_type}</span>", unsafe_allow_html=True)
+    if len(source_types) > 1:
+        st.caption(" · ".join(
+            f"{source or 'logs'}: {detected} ({confidence}%)" for source, (detected, confidence) in source_types.items()
+        ))
+
+    processed = processed_corpus(combined_logs, safe_mode)
+    processed_lines, processed_formats = processed["lines"], processed["formats"]
+    redaction_counts = processed["redactions"]
+
+    # Identity from content-defined chunks of the whole upload, not just its
+    # head; chunked and hashed once per processed corpus
+    def upload_identity():
+        upload_chunks = chunk_lines(combined_logs)
+        return corpus_id(upload_chunks), [c.id for c in upload_chunks]
+
+    log_id, chunk_ids = cached_artifact(processed, "identity", upload_identity)
+
+    if redaction_counts:
+        st.caption(
+            f"🕶️ Safe Mode redacted {redaction_counts['ip']} IPs, "
+            f"{redaction_counts['user']} users and {redaction_counts['path']} file paths."
+        )
 
-    logs = preprocess_logs(combined_logs)
-    if safe_mode:
-        logs = anonymize_logs(logs)
+    recognizer = TimestampRecognizer()
+    log_lines, event_rows, line_rows = cached_artifact(
+        processed, "events", lambda: index_timestamps(processed_lines, processed_formats))
+    # Repeated lines collapse to one template each before any LLM call; mining
+    # and clustering run once per processed corpus
+    templates = cached_artifact(processed, "templates", lambda: mine_templates(log_lines, TimestampRecognizer()))
+    llm_logs = cached_artifact(processed, "llm_logs", lambda: "\n".join(collapse_lines(log_lines, templates)))
+    if len(templates.templates) < len(log_lines):
+        st.caption(f"🧩 {len(log_lines)} events collapse to {len(templates.templates)} templates for the LLM.")
+
+    template_clusters = cached_artifact(processed, "template_clusters", lambda: cluster_templates(templates))
+
+    # Local triage over every event decides what gets the LLM budget first;
+    # it is scored once per processed corpus
+    triaged = cached_artifact(processed, "triaged", lambda: triage(log_lines))
+    template_values = group_scores([t.members for t in templates.templates], triaged.scores)
+    anomalous = [w for w in triaged.windows if w.reasons][:5]
+    if anomalous:
+        with st.expander("🚨 Most anomalous windows (local triage)"):
+            for w in anomalous:
+                st.markdown(f"- **{w.source or 'logs'}** {w.start or ''} — score {w.score}: {w.reasons}")
+
+    # Classification is reused per chunk of the processed lines
+    line_chunks = cached_artifact(processed, "line_chunks", lambda: chunk_lines(log_lines))
 
-    log_lines = [
-        line.strip()
-        for line in logs.splitlines()
-        if line.strip() and not is_timestamp_only(line)
-    ]
     @st.cache_data(show_spinner="Classifying logs with LLM...")
-    def get_llm_classified(log_lines):
-        return classify_logs_with_llm(log_lines)
+    def get_llm_classified(log_lines, _chunks, _scores, reuse_templates):
+        classified, reused = classify_logs_by_chunk(log_lines, _chunks, _scores, reuse_templates)
+        if reused:
+            print(f"[CHUNKS] Reused classifications for {reused} of {len(_chunks)} chunks")
+        return classified
 
-    llm_classified = get_llm_classified(log_lines)
-    st.session_state["combined_logs"] = combined_logs
+    llm_classified = get_llm_classified(log_lines, line_chunks, triaged.scores, reuse_templates)
     st.session_state["llm_classified"] = llm_classified
     
 
@@ -490,9 +604,9 @@ if combined_logs:
 
     if "llm_classified" not in st.session_state:
         @st.cache_data(show_spinner="Classifying logs with LLM...")
-        def get_llm_classified(log_lines):
-            return classify_logs_with_llm(log_lines)
-        llm_classified = get_llm_classified(log_lines)
+        def get_llm_classified(log_lines, _chunks, _scores, reuse_templates):
+            return classify_logs_by_chunk(log_lines, _chunks, _scores, reuse_templates)[0]
+        llm_classified = get_llm_classified(log_lines, line_chunks, triaged.scores, reuse_templates)
         st.session_state.llm_classified = llm_classified
     else:
         llm_classified = st.session_state.llm_classified
@@ -507,21 +621,85 @@ if combined_logs:
 
     # 🔁 Always load feedback and check if any apply to this log_id
     feedback_data = load_feedback()
-    log_feedback = [f for f in feedback_data if f.get("log_id") == log_id]
+    # Feedback applies to this log set, or to an upload sharing most of its
+    # chunks (the same incident with lines added or cut); a common header
+    # chunk alone is not enough
+    def matching_feedback(entries):
+        return [
+            f for f in entries
+            if f.get("log_id") == log_id
+            or chunk_overlap(chunk_ids, f.get("chunk_ids") or []) >= FEEDBACK_MIN_CHUNK_OVERLAP
+        ]
 
-    # 🔄 Re-analyze if it's a new session or feedback applies to this log_id
-    if "llm_result" not in st.session_state or log_feedback:
+    def feedback_key(entries):
+        # Identity of a set of corrections, to tell whether the report already reflects them
+        return tuple(sorted((str(f.get("log_id")), f.get("correction") or "") for f in entries))
+
+    log_feedback = matching_feedback(feedback_data)
+
+    # Sections of a streamed report show here as they are written, until the
+    # full report is laid out below
+    live_report = st.empty()
+    live_sections = []
+    LIVE_SECTION_TITLES = {
+        "STEP-BY-STEP TIMELINE": "🕒 Step-by-Step Timeline",
+        "ROOT CAUSE": "🧠 Root Cause",
+        "TOTAL IMPACT": "📉 Total Impact",
+        "REMEDIATION STEPS": "🛠️ Remediation Steps",
+        "RISK SCORE FOR EACH EVENT": "⚠️ Risk Scores",
+        "CONFIDENCE LEVELS PER CONCLUSION": "✅ Confidence Levels",
+        "MISSING CONTEXT OR DATA": "🔍 Missing Context or Data",
+        "LOGS CONTRIBUTING TO EACH FINDING": "📚 Logs Contributing to Each Finding",
+    }
+
+    def show_live_section(title, body):
+        live_sections.append((title, body))
+        with live_report.container():
+            for name, text in live_sections:
+                with st.container(border=True):
+                    st.markdown(f"**{LIVE_SECTION_TITLES.get(name, name.title())}**")
+                    if name == "STEP-BY-STEP TIMELINE":
+                        st.code(text, language="text")
+                    else:
+                        st.markdown(text)
+
+    # 🔄 Re-analyze if it's a new session or feedback for this log set arrived
+    # since the report was made; plain reruns (theme, sliders) reuse it
+    if "llm_result" not in st.session_state or st.session_state.get("applied_feedback") != feedback_key(log_feedback):
         with st.spinner("Analyzing logs with LLM + Feedback..."):
             rag_context = st.session_state.get("rag_context", "")
-            result, audit_data, _ = auto_correct_and_rerun(logs, log_id, feedback_data_override=feedback_data, rag_context_override=rag_context)
-            store_audit_log(log_id, audit_data)
+            result, audit_data, _ = auto_correct_and_rerun(llm_logs, log_id, feedback_data_override=feedback_data, rag_context_override=rag_context, line_values=template_values,
+                                                           on_section=show_live_section if stream_report else None,
+                                                           log_type=log_type)
+            store_audit_log(log_id, audit_data, chunk_ids)
             st.session_state.llm_result = result
             st.session_state.audit_data = audit_data
+            st.session_state.applied_feedback = feedback_key(log_feedback)
     else:
         result = st.session_state.llm_result
         audit_data = st.session_state.get("audit_data", {})
         st.session_state["llm_result"] = result
 
+    map_reduce = audit_data.get("map_reduce") if isinstance(audit_data, dict) else None
+    if map_reduce:
+        st.caption(
+            f"🧮 Logs exceed one prompt: analyzed in {map_reduce['windows']} time windows "
+            f"({map_reduce['windows_reused']} reused, {map_reduce['windows_failed']} failed) and merged."
+        )
+    budget = audit_data.get("token_budget") if isinstance(audit_data, dict) else None
+    if budget and not map_reduce and (budget["logs_dropped"] or budget["rag_tokens_dropped"] or budget["feedback_tokens_dropped"]):
+        st.caption(
+            f"✂️ Prompt packed to {budget['prompt_tokens']} tokens: {budget['logs_dropped']} log lines, "
+            f"{budget['rag_tokens_dropped']} threat-context and {budget['feedback_tokens_dropped']} feedback tokens left out."
+        )
+    response_cache = get_cache()
+    if response_cache and response_cache.hits:
+        cache_stats = response_cache.stats()
+        st.caption(
+            f"♻️ {cache_stats['hits']} LLM calls answered from the response cache "
+            f"({cache_stats['misses']} sent, {cache_stats['entries']} responses stored)."
+        )
+
     # ✅ Optional: Display applied feedback below result
     if log_feedback:
         st.markdown("### ♻️ Past Corrections Applied")
@@ -536,13 +714,8 @@ if combined_logs:
     
     from rag.vector_store_qdrant import ThreatRAG
     with st.expander("RAG Context Injected"):
-        log_lines = [
-            line.strip()
-            for line in logs.splitlines()
-            if line.strip() and not is_timestamp_only(line)
-        ]
         with st.spinner("🔍 Loading RAG Context..."):
-            threat_rag = ThreatRAG(log_lines)
+            threat_rag = ThreatRAG(log_lines, line_chunks)
             rag_context = threat_rag.search(log_lines)
             st.session_state["rag_context"] = rag_context  # ✅ Store it
 
@@ -612,31 +785,15 @@ if combined_logs:
 
     # --- Helper: Parse LLM Output Into Sections ---
     def parse_llm_output(result_text):
-        sections = {}
-        current_section = ""
-        lines = result_text.strip().splitlines()
-
-        for line in lines:
-            line = line.strip()
-
-            # Match both "SECTION" and "1. SECTION"
-            match = re.match(r"^(?:\d+\.\s*)?([A-Z \-]+)$", line)
-            if match:
-                current_section = match.group(1).strip()
-                sections[current_section] = []
-            elif current_section:
-                sections[current_section].append(line)
-
-        for key in sections:
-            sections[key] = "\n".join(sections[key]).strip()
-
-        return sections
+        # Matches both "SECTION" and "1. SECTION"; same parser as the live stream
+        return parse_report(result_text)
 
     
     # st.markdown("### 🔍 Raw AI Response (Debug)")
     # st.code(result[:1500], language='text')
 
     # --- Parse Result ---
+    live_report.empty()
     sections = parse_llm_output(result)
 
     # --- Incident Summary Metrics (Estimate from Sections) ---
@@ -875,12 +1032,26 @@ if combined_logs:
         st.markdown(sections["LOGS CONTRIBUTING TO EACH FINDING"])
         st.markdown("</div>", unsafe_allow_html=True)
 
+        cited = evidence_clusters(sections["LOGS CONTRIBUTING TO EACH FINDING"], templates, template_clusters)
+        similar = [members for members in cited if len(members) > 1]
+        if similar:
+            with st.expander(f"🔗 Similar events behind the cited logs ({sum(map(len, similar))} lines)"):
+                for members in similar:
+                    # Member lines are read back from the mapped corpus by row
+                    shown = [processed_lines.text(event_rows[i]) for i in members[:50]]
+                    st.markdown(f"**{len(members)} events like:** `{shown[0]}`")
+                    st.code("\n".join(shown) + (f"\n... {len(members) - 50} more" if len(members) > 50 else ""))
+
 
     timeline_data_for_plotly = []
 
 
     with st.expander("📄 View Raw Logs"):
-        st.code(logs)
+        # One page at a time, read from the mapped file
+        raw_pages = max(1, -(-len(processed_lines) // RAW_LOG_PAGE_LINES))
+        raw_page = st.number_input(f"Page (of {raw_pages})", min_value=1, max_value=raw_pages, value=1, step=1)
+        raw_start = (raw_page - 1) * RAW_LOG_PAGE_LINES
+        st.code("\n".join(processed_lines.iter_text(raw_start, raw_start + RAW_LOG_PAGE_LINES)))
 
     with st.expander("🤖 LLM Classifications"):
         st.json(llm_classified)
@@ -895,7 +1066,6 @@ if combined_logs:
         return "<br>".join(textwrap.wrap(text, width=max_length))
 
     timeline_data_for_plotly = []
-    event_index = 0
     import re
     from dateutil import parser as dtparser
     import datetime
@@ -908,10 +1078,10 @@ if combined_logs:
 
         timeline_data_for_plotly = []
         for idx, line in enumerate(lines):
-            m = re.match(r"-\s*([\d\-T:\.Z]+):\s*(.+)", line)
-            if not m:
+            step = timeline_step(line)
+            if not step:
                 continue
-            ts_str, desc = m.groups()
+            ts_str, desc = step
             try:
                 ts = dtparser.parse(ts_str)
             except Exception:
@@ -942,7 +1112,12 @@ if combined_logs:
             })
     elif is_json_file and not timeline_data_for_plotly:
         try:
-            json_logs = json.loads(combined_logs)
+            json_logs = []
+            for line in combined_logs:
+                try:
+                    json_logs.append(parse_json_event(line))
+                except ValueError:
+                    continue  # plain-text line from a mixed upload
             for idx, entry in enumerate(json_logs):
                 ts_str = entry.get("timestamp")
                 desc = entry.get("event") or entry.get("full_log") or json.dumps(entry)
@@ -959,43 +1134,43 @@ if combined_logs:
 
 
     elif not is_json_file:
-        timestamp_patterns = [
-            re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[\+\-]\d{2}:\d{2})?)\s*[:,\-]?\s*(.+)"),
-            re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-            re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}):\s+(.+)"),
-            re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]\s+(.+)"),
-            re.compile(r"^([A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-            re.compile(r"^(\d{10})\s+(.+)"),
-            re.compile(r"^\[[^\]]+\]\s+(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\s+(.+)"),
-        ]
-
+        import numpy as np
 
+        timeline_items = []
+        timeline_matches = []
         for item in llm_classified:
-            line = item["log"]
-            original_line = line
-            source = "Unknown"
-            if line.startswith("["):
-                parts = line.split("]", 1)
-                if len(parts) == 2:
-                    source = parts[0][1:]
-                    line = parts[1].strip()
-
-            for pattern in timestamp_patterns:
-                match = pattern.match(line)
-                if match:
-                    ts_str, desc = match.groups()
-                    dt = dtparser.parse(ts_str)
-                    timeline_data_for_plotly.append({
-                        "Event": f"Event {event_index + 1}",
-                        "Start": dt,
-                        "End": dt + datetime.timedelta(seconds=1),
-                        "Risk Level": item["risk_level"],
-                        "Description": wrap_text(
-                            f"<br>Source: {source}<br>Log: {original_line}<br>Justification: {item.get('justification', 'N/A')}<br>Confidence: {item.get('confidence', 'N/A')}%"
-                        )
-                    })
-                    event_index += 1
-                    break  # match found, skip remaining patterns
+            # Corpus lines are looked up by row and matched with the format
+            # recorded at preprocessing; only lines the LLM rewrote are
+            # matched as written
+            row = line_rows.get(item["log"].strip())
+            if row is not None:
+                match = match_format(processed_lines.text(row), processed_formats[row])
+            else:
+                match = recognizer.match(item["log"])
+            if match:
+                timeline_items.append(item)
+                timeline_matches.append(match)
+
+        # Parse all timestamps in one vectorized pass into a datetime64 column
+        starts = timestamp_column(timeline_matches)
+        parsed = ~np.isnat(starts)
+        timeline_items = [item for item, ok in zip(timeline_items, parsed) if ok]
+        timeline_matches = [match for match, ok in zip(timeline_matches, parsed) if ok]
+        starts = starts[parsed]
+
+        if timeline_items:
+            timeline_data_for_plotly = {
+                "Event": [f"Event {i + 1}" for i in range(len(timeline_items))],
+                "Start": starts,
+                "End": starts + np.timedelta64(1, "s"),
+                "Risk Level": [item["risk_level"] for item in timeline_items],
+                "Description": [
+                    wrap_text(
+                        f"<br>Source: {match.source or 'Unknown'}<br>Log: {item['log']}<br>Justification: {item.get('justification', 'N/A')}<br>Confidence: {item.get('confidence', 'N/A')}%"
+                    )
+                    for item, match in zip(timeline_items, timeline_matches)
+                ],
+            }
 
 
     df = pd.DataFrame(timeline_data_for_plotly)
@@ -1115,7 +1290,7 @@ if combined_logs:
         st.session_state["run_again"] = st.checkbox("Re-run analysis using your correction?")
 
         if st.button("Submit Feedback"):
-            store_feedback(log_id, st.session_state["feedback"], st.session_state["correction"])
+            store_feedback(log_id, st.session_state["feedback"], st.session_state["correction"], chunk_ids)
             st.success("Feedback saved successfully!")
             st.session_state["submit_feedback"] = True
             from feedback_enhancer import load_feedback
@@ -1124,13 +1299,15 @@ if combined_logs:
                 feedback_data = load_feedback()
                 feedback_data.append({
                     "log_id": log_id,
+                    "chunk_ids": chunk_ids,
                     "feedback": st.session_state["feedback"],
                     "correction": st.session_state["correction"]
                 })
                 new_report, _, used_feedback = auto_correct_and_rerun(
-                    logs,  # ✅ The real original logs, not the correction
+                    llm_logs,  # ✅ The real original logs (template-collapsed), not the correction
                     log_id,
-                    feedback_data_override=feedback_data  # ← includes both existing & newly added
+                    feedback_data_override=feedback_data,  # ← includes both existing & newly added
+                    line_values=template_values
 
                 )
 
@@ -1138,6 +1315,7 @@ if combined_logs:
                 # Instead of appending the report, update the session state
                 st.session_state["llm_result"] = new_report
                 st.session_state["audit_data"] = {}  # Optionally update if needed
+                st.session_state["applied_feedback"] = feedback_key(matching_feedback(feedback_data))
 
                 # Force re-render of the existing report section with new data
                 st.rerun()
@@ -38,19 +38,24 @@ def find_similar_feedback(log_text, feedback_data, threshold=0.6):
     return matches
 
 
-def enhance_prompt_with_feedback(log_text, matched_feedback):
+def feedback_block(matched_feedback):
     if not matched_feedback:
-        return log_text
+        return ""
 
     feedback_notes = "\n".join(
         [f"- {fb['correction'].strip()}" for fb in matched_feedback if fb.get("correction")]
     )
 
-    enhancement_block = (
+    return (
         "IMPORTANT: The following are user-supplied expert corrections or suggestions. "
         "Use them to improve the analysis below:\n\n" + feedback_notes
     )
 
+
+def enhance_prompt_with_feedback(log_text, matched_feedback):
+    enhancement_block = feedback_block(matched_feedback)
+    if not enhancement_block:
+        return log_text
     return f"{enhancement_block}\n\n{log_text}"
 
 # def auto_correct_and_rerun(log_text, log_id, feedback_data_override=None):
@@ -62,16 +67,22 @@ def enhance_prompt_with_feedback(log_text, matched_feedback):
 #     store_audit_log(f"{log_id}_enhanced", audit)
 #     return result, matches
 
-def auto_correct_and_rerun(log_text, log_id, feedback_data_override=None, rag_context_override=None):
+def auto_correct_and_rerun(log_text, log_id, feedback_data_override=None, rag_context_override=None, line_values=None,
+                           on_section=None, log_type=None):
     feedback_data = feedback_data_override if feedback_data_override else load_feedback()
     matches = find_similar_feedback(log_text, feedback_data)
 
     if feedback_data_override:
         matches.extend([fb for fb in feedback_data_override if fb not in matches])
 
-    enhanced_text = enhance_prompt_with_feedback(log_text, matches)
-    log_type = detect_log_type(enhanced_text)
-    result_text, audit_dict = analyze_logs(enhanced_text, log_type, rag_context=rag_context_override)
+    # Feedback goes in as its own block so the token budget can pack it ahead of the logs.
+    # The app passes the types detected per source at upload; the collapsed
+    # text is only scanned when no type is given.
+    if log_type is None:
+        log_type = detect_log_type(log_text)
+    result_text, audit_dict = analyze_logs(log_text, log_type, rag_context=rag_context_override,
+                                           feedback_notes=feedback_block(matches), line_values=line_values,
+                                           on_section=on_section)
 
     if isinstance(audit_dict, dict):
         store_audit_log(f"{log_id}_enhanced", audit_dict)
@@ -0,0 +1,267 @@
+# llm_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# On-disk store of LLM responses, keyed by the full request. Set
+# FORENSIQ_LLM_CACHE=0 to switch it off.
+CACHE_PATH = os.getenv("FORENSIQ_LLM_CACHE", os.path.join(".cache", "llm_responses.sqlite"))
+# Least recently used responses are evicted beyond this many
+CACHE_MAX_ENTRIES = int(os.getenv("FORENSIQ_LLM_CACHE_MAX_ENTRIES", "5000"))
+# Seconds a response stays valid; 0 keeps it until evicted
+CACHE_TTL = float(os.getenv("FORENSIQ_LLM_CACHE_TTL", "0"))
+
+# Classifications of masked event templates, reused across incidents. Set
+# FORENSIQ_TEMPLATE_CACHE=0 to switch it off.
+TEMPLATE_CACHE_PATH = os.getenv("FORENSIQ_TEMPLATE_CACHE", os.path.join(".cache", "template_classifications.sqlite"))
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("FORENSIQ_TEMPLATE_CACHE_MAX_ENTRIES", "20000"))
+# Days a template may go unseen before its classification is dropped
+TEMPLATE_CACHE_MAX_AGE_DAYS = float(os.getenv("FORENSIQ_TEMPLATE_CACHE_MAX_AGE_DAYS", "30"))
+# Only fields that hold for the template in any incident; a justification names
+# this incident's hosts and users
+CLASSIFICATION_FIELDS = ("risk_score", "risk_level", "confidence")
+
+# Per-line classifications of content-defined chunks, reused by overlapping
+# uploads across runs. Set FORENSIQ_CHUNK_CACHE=0 to switch it off.
+CHUNK_CACHE_PATH = os.getenv("FORENSIQ_CHUNK_CACHE", os.path.join(".cache", "chunk_classifications.sqlite"))
+# Least recently used chunks are evicted beyond this many
+CHUNK_CACHE_MAX_ENTRIES = int(os.getenv("FORENSIQ_CHUNK_CACHE_MAX_ENTRIES", "4096"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    body BLOB NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+_TEMPLATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    template TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL
+)
+"""
+_CHUNK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    id TEXT PRIMARY KEY,
+    items TEXT NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _connect(path: str, schema: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute(schema)
+    return db
+
+
+def request_key(payload: dict) -> str:
+    # Model, parameters and fully rendered messages; key order does not matter
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    # SQLite-backed, shared by every thread of the process; survives restarts.
+    # Counters cover this process only.
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES, ttl: float = CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = _connect(path, _SCHEMA)
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    def get(self, key: str) -> bytes | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT body, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and now - row[1] > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, body: bytes, model: str = ""):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)", (key, model, body, now, now))
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                (count - self.max_entries,))
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {"entries": entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None}
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+
+class ClassificationCache:
+    # Classifier output per masked event template. Templates unseen for
+    # max_age_days expire; beyond max_entries the least used go first, the
+    # longest unseen among equals.
+
+    def __init__(self, path: str = TEMPLATE_CACHE_PATH, max_entries: int = TEMPLATE_CACHE_MAX_ENTRIES,
+                 max_age_days: float = TEMPLATE_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = _connect(path, _TEMPLATE_SCHEMA)
+
+    def get_many(self, templates: list[str]) -> dict[str, dict]:
+        # Known templates -> {risk_score, risk_level, confidence}
+        now = time.time()
+        found = {}
+        with self._lock:
+            if self.max_age:
+                self._db.execute("DELETE FROM classifications WHERE last_used < ?", (now - self.max_age,))
+            for template in set(templates):
+                row = self._db.execute("SELECT result FROM classifications WHERE template = ?",
+                                       (template,)).fetchone()
+                if row is None:
+                    continue
+                found[template] = json.loads(row[0])
+                self._db.execute("UPDATE classifications SET last_used = ?, uses = uses + 1 WHERE template = ?",
+                                 (now, template))
+            self.hits += len(found)
+            self.misses += len(set(templates)) - len(found)
+        return found
+
+    def put_many(self, results: dict[str, dict]):
+        now = time.time()
+        rows = [(template, json.dumps({k: item.get(k) for k in CLASSIFICATION_FIELDS}), now, now)
+                for template, item in results.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO classifications VALUES (?, ?, ?, ?, 1)", rows)
+            (count,) = self._db.execute("SELECT COUNT(*) FROM classifications").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM classifications WHERE template IN "
+                    "(SELECT template FROM classifications ORDER BY uses, last_used LIMIT ?)",
+                    (count - self.max_entries,))
+            self._db.execute("COMMIT")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM classifications")
+
+
+class ChunkCache:
+    # Classified lines per chunk ID, least recently used evicted first
+
+    def __init__(self, path: str = CHUNK_CACHE_PATH, max_entries: int = CHUNK_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = _connect(path, _CHUNK_SCHEMA)
+
+    def get_many(self, chunk_ids: list[str]) -> dict[str, list[dict]]:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for chunk_id in set(chunk_ids):
+                row = self._db.execute("SELECT items FROM chunks WHERE id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    found[chunk_id] = json.loads(row[0])
+                    self._db.execute("UPDATE chunks SET last_used = ? WHERE id = ?", (now, chunk_id))
+        return found
+
+    def put_many(self, chunks: dict[str, list[dict]]):
+        now = time.time()
+        rows = [(chunk_id, json.dumps(items, ensure_ascii=False), now) for chunk_id, items in chunks.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", rows)
+            (count,) = self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()
+            if count > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM chunks WHERE id IN (SELECT id FROM chunks ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,))
+            self._db.execute("COMMIT")
+
+
+_cache: ResponseCache | None = None
+_template_cache: ClassificationCache | None = None
+_chunk_cache: ChunkCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache | None:
+    # Process-wide cache, or None when disabled or the file cannot be opened
+    global _cache
+    if CACHE_PATH in ("", "0"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ResponseCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[LLM CACHE] Disabled: {e}")
+                return None
+        return _cache
+
+
+def get_template_cache() -> ClassificationCache | None:
+    # Process-wide template cache, or None when disabled or unavailable
+    global _template_cache
+    if TEMPLATE_CACHE_PATH in ("", "0"):
+        return None
+    with _cache_lock:
+        if _template_cache is None:
+            try:
+                _template_cache = ClassificationCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[TEMPLATE CACHE] Disabled: {e}")
+                return None
+        return _template_cache
+
+
+def get_chunk_cache() -> ChunkCache | None:
+    # Process-wide chunk cache, or None when disabled or unavailable
+    global _chunk_cache
+    if CHUNK_CACHE_PATH in ("", "0"):
+        return None
+    with _cache_lock:
+        if _chunk_cache is None:
+            try:
+                _chunk_cache = ChunkCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[CHUNK CACHE] Disabled: {e}")
+                return None
+        return _chunk_cache
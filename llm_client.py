@@ -0,0 +1,245 @@
+# llm_client.py
+
+import json
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterator, NamedTuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from llm_cache import get_cache, request_key
+
+GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
+
+# Seconds to establish a connection and to wait for the response
+CONNECT_TIMEOUT = float(os.getenv("FORENSIQ_LLM_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("FORENSIQ_LLM_READ_TIMEOUT", "120"))
+# Retries after the first attempt, for rate limits, server errors and network failures
+MAX_RETRIES = int(os.getenv("FORENSIQ_LLM_RETRIES", "4"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# Longest Retry-After the client waits out; a longer one ends the retries
+RETRY_AFTER_MAX = float(os.getenv("FORENSIQ_LLM_RETRY_AFTER_MAX", "300"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Keep-alive connections held open to the provider
+POOL_SIZE = 16
+
+
+class CallRecord(NamedTuple):
+    model: str
+    status: int | None
+    latency: float   # seconds, all attempts and waits included
+    attempts: int
+    cached: bool = False
+    first_token: float | None = None  # seconds until the first streamed token
+
+
+_session: requests.Session | None = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    # One pooled session per process: TLS handshakes are paid once, not per call
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def _retry_after(response: requests.Response) -> float | None:
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: spreads retries of concurrent callers apart
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _cached_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    response.headers["Content-Type"] = "application/json"
+    response.url = GROQ_URL
+    response.encoding = "utf-8"
+    return response
+
+
+def has_content(content: str) -> bool:
+    return bool(content.strip())
+
+
+def _message_content(body: bytes) -> str | None:
+    try:
+        content = json.loads(body)["choices"][0]["message"]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+    return content if isinstance(content, str) else None
+
+
+def chat_completion(payload: dict, timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                    max_retries: int = MAX_RETRIES, use_cache: bool = True,
+                    cache_if: Callable[[str], bool] = has_content,
+                    on_record: Callable[[CallRecord], None] | None = None) -> requests.Response:
+    # POSTs a chat completion through the shared session. Retries 429/5xx
+    # (waiting out Retry-After, up to RETRY_AFTER_MAX) and connection errors/timeouts with jittered
+    # exponential backoff; the last response is returned whatever its status,
+    # and the last network error is raised. Identical requests are answered
+    # from the on-disk response cache. A 200 response is stored only when
+    # cache_if accepts its message content, so an answer the caller cannot
+    # use is never replayed to a retry or a later run. on_record receives the
+    # CallRecord of this call, also when it ends in a network error.
+    model = payload.get("model", "")
+    started = time.perf_counter()
+    cache = get_cache() if use_cache else None
+    key = request_key(payload) if cache else None
+    if cache:
+        body = cache.get(key)
+        if body is not None:
+            _report(on_record, _record(model, 200, started, 0, cached=True))
+            return _cached_response(body)
+
+    response, attempts = _send(payload, timeout, max_retries, started, on_record=on_record)
+    _report(on_record, _record(model, response.status_code, started, attempts))
+    if cache and response.status_code == 200:
+        content = _message_content(response.content)
+        if content is not None and cache_if(content):
+            cache.put(key, response.content, model)
+    return response
+
+
+def stream_chat_completion(payload: dict, timeout: tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT),
+                           max_retries: int = MAX_RETRIES, use_cache: bool = True,
+                           cache_if: Callable[[str], bool] = has_content,
+                           on_record: Callable[[CallRecord], None] | None = None) -> Iterator[str]:
+    # Yields the completion text as the provider generates it (server-sent
+    # events). Retries happen only before the first token; an error status
+    # raises requests.HTTPError. A finished stream that cache_if accepts is
+    # cached like the same request made through chat_completion, and a cached
+    # answer is yielded in one piece. The call is recorded once the stream
+    # ends: with status 200 only if it ran to completion, None if it broke off.
+    model = payload.get("model", "")
+    started = time.perf_counter()
+    cache = get_cache() if use_cache else None
+    key = request_key(payload) if cache else None
+    if cache:
+        body = cache.get(key)
+        if body is not None:
+            _report(on_record, _record(model, 200, started, 0, cached=True))
+            yield json.loads(body)["choices"][0]["message"]["content"]
+            return
+
+    response, attempts = _send({**payload, "stream": True}, timeout, max_retries, started, stream=True,
+                               on_record=on_record)
+    if response.status_code != 200:
+        _report(on_record, _record(model, response.status_code, started, attempts))
+        response.raise_for_status()
+
+    parts = []
+    first_token = None
+    finished = False
+    response.encoding = "utf-8"  # text/event-stream without a charset would decode as latin-1
+    try:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue  # keep-alives and comments
+            data = line[5:].strip()
+            if data == "[DONE]":
+                finished = True
+                break
+            event = json.loads(data)
+            if event.get("error"):
+                raise requests.RequestException(f"Stream error: {event['error']}")
+            choices = event.get("choices") or [{}]
+            text = (choices[0].get("delta") or {}).get("content")
+            if text:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                parts.append(text)
+                yield text
+    finally:
+        response.close()
+        _report(on_record, _record(model, 200 if finished else None, started, attempts, first_token=first_token))
+
+    if cache and finished and cache_if("".join(parts)):
+        body = {"model": model, "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": "".join(parts)}, "finish_reason": "stop"}]}
+        cache.put(key, json.dumps(body).encode("utf-8"), model)
+
+
+def _send(payload: dict, timeout: tuple[float, float], max_retries: int, started: float,
+          stream: bool = False, on_record: Callable[[CallRecord], None] | None = None
+          ) -> tuple[requests.Response, int]:
+    # The retry loop shared by both entry points; returns (response, attempts).
+    # A call that fails on the network is recorded here, as it never returns.
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        raise EnvironmentError("❌ GROQ_API_KEY not set. Please add it in Render environment variables.")
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+    model = payload.get("model", "")
+    session = get_session()
+
+    for attempt in range(max_retries + 1):
+        try:
+            response = session.post(GROQ_URL, headers=headers, json=payload, timeout=timeout, stream=stream)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == max_retries:
+                _report(on_record, _record(model, None, started, attempt + 1))
+                raise
+            delay = _backoff(attempt)
+            print(f"[LLM] {type(e).__name__}; retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < max_retries:
+            delay = _retry_after(response)
+            if delay is not None and delay > RETRY_AFTER_MAX:
+                print(f"[LLM] HTTP {response.status_code}; Retry-After {delay:.0f}s exceeds {RETRY_AFTER_MAX:.0f}s, giving up")
+                return response, attempt + 1
+            delay = delay if delay is not None else _backoff(attempt)
+            print(f"[LLM] HTTP {response.status_code}; retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(delay)
+            continue
+
+        return response, attempt + 1
+
+
+def _record(model: str, status: int | None, started: float, attempts: int, cached: bool = False,
+            first_token: float | None = None) -> CallRecord:
+    record = CallRecord(model, status, time.perf_counter() - started, attempts, cached, first_token)
+    if cached:
+        print(f"[LLM] {model} -> cached response")
+        return record
+    streamed = f", first token after {first_token:.2f}s" if first_token is not None else ""
+    print(f"[LLM] {model} -> {status} in {record.latency:.2f}s{streamed} ({attempts} attempt{'s' if attempts > 1 else ''})")
+    return record
+
+
+def _report(on_record: Callable[[CallRecord], None] | None, record: CallRecord):
+    if on_record:
+        on_record(record)
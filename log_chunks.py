@@ -0,0 +1,65 @@
+# log_chunks.py
+
+import hashlib
+import zlib
+from typing import Iterable, NamedTuple
+
+# Content-defined chunking over events: a boundary falls after an event when
+# the rolling hash of the events before it has its low bits clear, so
+# boundaries depend only on nearby content and re-synchronise after an insert
+# or an appended tail. Sizes are in events (lines).
+CHUNK_MIN_EVENTS = 64
+CHUNK_AVG_EVENTS = 256  # power of two: the boundary mask
+CHUNK_MAX_EVENTS = 1024
+
+_MASK64 = (1 << 64) - 1
+_BOUNDARY_MASK = CHUNK_AVG_EVENTS - 1
+
+
+class LogChunk(NamedTuple):
+    id: str
+    start: int  # first line index
+    end: int    # one past the last line index
+
+
+def _gear(line: str) -> int:
+    # 64-bit pseudo-random value per event
+    h = zlib.crc32(line.encode("utf-8"))
+    return (h * 0x9E3779B97F4A7C15) & _MASK64
+
+
+def chunk_id(lines: list[str]) -> str:
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()[:20]
+
+
+def chunk_lines(log_lines: list[str], min_events: int = CHUNK_MIN_EVENTS,
+                max_events: int = CHUNK_MAX_EVENTS) -> list[LogChunk]:
+    # Gear hash: shifting left one bit per event means each event influences
+    # the hash for the next 64 events only, which is what makes it rolling
+    chunks = []
+    start = 0
+    rolling = 0
+    for i, line in enumerate(log_lines):
+        rolling = ((rolling << 1) + _gear(line)) & _MASK64
+        size = i + 1 - start
+        if (size >= min_events and (rolling >> 40) & _BOUNDARY_MASK == 0) or size >= max_events:
+            chunks.append(LogChunk(chunk_id(log_lines[start:i + 1]), start, i + 1))
+            start = i + 1
+            rolling = 0
+    if start < len(log_lines):
+        chunks.append(LogChunk(chunk_id(log_lines[start:]), start, len(log_lines)))
+    return chunks
+
+
+def corpus_id(chunks: list[LogChunk]) -> str:
+    # Identity of a whole log set: its ordered chunk IDs
+    return "log_" + hashlib.sha256(",".join(c.id for c in chunks).encode("utf-8")).hexdigest()[:32]
+
+
+def chunk_overlap(chunk_ids: Iterable[str], other_ids: Iterable[str]) -> float:
+    # Share of chunks two log sets have in common, relative to the larger one,
+    # so a shared header chunk alone does not make two incidents related
+    ours, theirs = set(chunk_ids), set(other_ids)
+    if not ours or not theirs:
+        return 0.0
+    return len(ours & theirs) / max(len(ours), len(theirs))
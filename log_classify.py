@@ -0,0 +1,200 @@
+# log_classify.py
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import chat_completion
+from log_triage import triage
+from prompt_compression import PROMPT_COMPRESSION, PromptCompressor
+from token_budget import PromptTooLarge, check_request, count_tokens, count_tokens_lines, model_limits
+
+# Classification: logs per request, concurrent requests, and extra attempts
+# for a batch that failed or came back unparseable
+CLASSIFY_BATCH_SIZE = 50
+CLASSIFY_WORKERS = int(os.getenv("FORENSIQ_CLASSIFY_WORKERS", "4"))
+CLASSIFY_BATCH_RETRIES = 2
+# Completion tokens reserved per classified log: its echoed log text (JSON
+# escaping included, hence the margin) plus the other fields and a short
+# justification. A batch reserves the sum over its logs.
+CLASSIFY_ECHO_MARGIN = 1.25
+CLASSIFY_TOKENS_PER_LOG = 120
+
+
+def classify_output_tokens(line_tokens: int) -> int:
+    # Completion tokens one classified log may take
+    return int(line_tokens * CLASSIFY_ECHO_MARGIN) + CLASSIFY_TOKENS_PER_LOG
+
+
+def classify_logs_with_llm(log_lines: list[str], values: list[float] | None = None) -> list[dict]:
+    import os
+    import json
+
+    API_KEY = os.getenv("GROQ_API_KEY")
+    if not API_KEY:
+        raise EnvironmentError("❌ GROQ_API_KEY not set. Please add it in Render environment variables.")
+
+    # Batch prompt; logs are appended per batch below
+    batched_prompt = """You are a cybersecurity log classifier.
+For each of the following logs, return a JSON object with:
+- log (original string)
+- risk_score (0–100)
+- risk_level (High, Medium, Low) based on score (>=70 = High, 40–69 = Medium, <40 = Low)
+- justification (short reason)
+- confidence (0–100)
+SCORING GUIDANCE:
+- Evaluate events **in their full context**, not in isolation.
+- Low-risk actions (e.g., successful logins, backups, configuration changes) should receive **higher risk scores** if they precede or correlate with downstream issues like failures, alerts, access denials, or anomalous behavior.
+- Analyze **sequences of events** — if a benign-looking log is the trigger for cascading failures, consider it a significant precursor.
+- Risk scores must reflect:
+  • Severity of the event
+  • Temporal proximity to other anomalies
+  • Repetition, frequency, or volume of similar events
+  • Anomalous user behavior (unexpected access, odd timing, privilege escalation)
+- Use statistical and behavioral inference to detect indirect contributors.
+- Do **not default to 0** unless an event is clearly unrelated and contextually irrelevant.
+- Justify each risk score briefly — especially when scoring events above or below what might be expected at first glance.
+CONFIDENCE SCORING:
+- Confidence values must reflect how strong the evidence is. Consider log clarity, repetition, direct cause-effect patterns, and absence of ambiguity.
+- Assign higher confidence when conclusions are directly supported by multiple consistent events. Lower it when logs are vague, missing, or indirectly inferred.
+
+Return a JSON array.
+
+Logs:
+"""
+    try:
+        instructions = check_request([{"role": "user", "content": batched_prompt}], CLASSIFY_TOKENS_PER_LOG)
+    except PromptTooLarge as e:
+        print("[TOKENS]", e)
+        return []
+    compressor = PromptCompressor() if PROMPT_COMPRESSION else None
+    prompt_lines = compressor.compress_lines(log_lines) if compressor else log_lines
+    notation = f"{compressor.legend()} The log field is the one exception: give each log back exactly as written here, T+N included.\n" if compressor else ""
+    batched_prompt += notation
+
+    # Every line is classified: batches of up to CLASSIFY_BATCH_SIZE lines
+    # whose prompt ("N. " numbering costs a few tokens per line) and output
+    # reservation (classify_output_tokens) fit the context together; long
+    # lines make smaller batches, since every answer echoes its line
+    limits = model_limits()
+    budget = limits.context - instructions - count_tokens(notation)
+    batches = []  # (first, last, output tokens reserved)
+    start = used = output = 0
+    for i, tokens in enumerate(count_tokens_lines(prompt_lines)):
+        cost, answer = tokens + 5, classify_output_tokens(tokens)
+        if i > start and (i - start >= CLASSIFY_BATCH_SIZE or used + output + cost + answer > budget
+                          or output + answer > limits.max_output):
+            batches.append((start, i, output))
+            start, used, output = i, 0, 0
+        used += cost
+        output += answer
+    if start < len(prompt_lines):
+        batches.append((start, len(prompt_lines), output))
+
+    # Most anomalous batches (by local triage) are sent first
+    values = values or triage(log_lines).scores
+    pending = sorted(range(len(batches)), key=lambda b: -max(values[batches[b][0]:batches[b][1]]))
+    results: list[list[dict] | None] = [None] * len(batches)
+    retried: set[int] = set()
+
+    def classify_batch(b: int) -> list[dict] | None:
+        first, last, max_tokens = batches[b]
+        prompt = batched_prompt + "\n".join(f"{i + 1}. {log}" for i, log in enumerate(prompt_lines[first:last]))
+        # A retried batch must reach the model, not the cached failure
+        return _classify_batch(prompt, log_lines[first:last], compressor, max_tokens, use_cache=b not in retried)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(CLASSIFY_WORKERS, len(batches)))) as pool:
+        # Failed batches are retried on their own; finished ones are kept
+        for attempt in range(CLASSIFY_BATCH_RETRIES + 1):
+            for b, items in zip(pending, pool.map(classify_batch, pending)):
+                results[b] = items
+            pending = [b for b in pending if results[b] is None]
+            if not pending:
+                break
+            retried.update(pending)
+            print(f"[CLASSIFY] {len(pending)} of {len(batches)} batches failed (attempt {attempt + 1})")
+
+    if pending:
+        print(f"[CLASSIFY] Giving up on {len(pending)} batches; their logs stay unclassified")
+    return [item for items in results if items for item in items]
+
+
+def _parse_classifications(content: str) -> list[dict] | None:
+    # The JSON array of per-log objects in a classifier answer, None if absent
+    match = re.search(r"\[.*\]", content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return None
+    return [item for item in items if isinstance(item, dict)] if isinstance(items, list) else None
+
+
+def _classify_batch(prompt: str, originals: list[str], compressor: PromptCompressor | None,
+                    max_tokens: int, use_cache: bool = True) -> list[dict] | None:
+    # One classification request; items come back in the order of `originals`.
+    # None means the batch failed and may be retried.
+    payload = {
+        "model": "llama-3.3-70b-versatile",
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.1,  # Makes it more deterministic
+        "max_tokens": max_tokens
+
+    }
+    try:
+        check_request(payload["messages"], max_tokens)
+    except PromptTooLarge as e:
+        print("[TOKENS]", e)
+        return []  # retrying would not make it fit
+
+    try:
+        # Only answers that parse are cached
+        res = chat_completion(payload, use_cache=use_cache,
+                              cache_if=lambda content: _parse_classifications(content) is not None)
+        res.raise_for_status()
+        content = res.json()["choices"][0]["message"]["content"]
+
+        # Extract JSON block from the output
+        classified = _parse_classifications(content)
+        if classified is None:
+            print("No JSON array found in Groq response.")
+            return None
+    except Exception as e:
+        print(f"[GROQ ERROR] {e}")
+        return None
+
+    for item in classified:
+        log = str(item.get("log", ""))
+        item["log"] = compressor.restore_line(log) if compressor else log
+        if compressor and isinstance(item.get("justification"), str):
+            item["justification"] = compressor.restore(item["justification"])
+
+    # Echoes that match a log claim it first (the model may reorder); order
+    # is used only to place the rest, and only when exactly one answer is
+    # left for each unclaimed log
+    slots: dict[str, list[int]] = {}
+    for position, line in enumerate(originals):
+        slots.setdefault(line, []).append(position)
+    assigned: list[dict | None] = [None] * len(originals)
+    leftovers = []
+    for item in classified:
+        positions = slots.get(item["log"])
+        if positions:
+            assigned[positions.pop(0)] = item
+        else:
+            leftovers.append(item)
+    open_slots = [position for position, item in enumerate(assigned) if item is None]
+    if leftovers and len(leftovers) == len(open_slots):
+        for position, item in zip(open_slots, leftovers):
+            assigned[position] = item
+    elif leftovers:
+        print(f"[CLASSIFY] {len(leftovers)} answers matched no log in their batch and were dropped")
+
+    for item, line in zip(assigned, originals):
+        if item is not None:
+            item["log"] = line
+    return [item for item in assigned if item is not None]
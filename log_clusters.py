@@ -0,0 +1,130 @@
+# log_clusters.py
+
+import hashlib
+import random
+import re
+from itertools import combinations
+
+# MinHash signature length and LSH banding: 16 bands of 4 rows puts the
+# candidate threshold near Jaccard 0.5, candidates are then checked against
+# JACCARD_THRESHOLD on their signatures
+NUM_PERM = 64
+LSH_BANDS = 16
+JACCARD_THRESHOLD = 0.6
+
+_MAX_HASH = (1 << 64) - 1
+_MASKS = [random.Random(seed).getrandbits(64) for seed in range(NUM_PERM)]
+# Words, parameters and paths; punctuation around them is not part of a shingle
+_WORD_RE = re.compile(r"<\*>|[\w'/.-]*\w")
+
+# Words that set which way an event went. Lines that differ in these are kept
+# apart however many other words they share.
+FAILURE_WORDS = frozenset({
+    "fail", "failed", "failing", "failure", "error", "errors", "denied", "refused", "rejected", "invalid",
+    "unable", "cannot", "can't", "couldn't", "not", "no", "never", "unauthorized", "forbidden",
+    "timeout", "timed", "aborted", "abort", "lost", "unreachable", "disconnected",
+})
+SUCCESS_WORDS = frozenset({
+    "accepted", "success", "successful", "successfully", "succeeded", "ok", "granted", "established",
+    "connected", "completed", "authenticated", "allowed", "passed",
+})
+
+
+# --- MinHash ---
+def shingles(text: str) -> set[str]:
+    # Word bigrams; a one-word line is its own shingle
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < 2:
+        return {" ".join(words)}
+    return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+def _hash64(shingle: str) -> int:
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def minhash(text: str, num_perm: int = NUM_PERM) -> tuple[int, ...]:
+    # Each "permutation" is the shingle hash XORed with a fixed random mask
+    hashes = [_hash64(s) for s in shingles(text)]
+    if not hashes:
+        return (_MAX_HASH,) * num_perm
+    return tuple(min(h ^ mask for h in hashes) for mask in _MASKS[:num_perm])
+
+
+def estimated_jaccard(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def polarity(text: str) -> tuple[bool, bool]:
+    # (names a failure or negation, names a success)
+    words = set(_WORD_RE.findall(text.lower()))
+    return bool(words & FAILURE_WORDS), bool(words & SUCCESS_WORDS)
+
+
+# --- LSH clustering ---
+def cluster_near_duplicates(texts: list[str], threshold: float = JACCARD_THRESHOLD,
+                            num_perm: int = NUM_PERM, bands: int = LSH_BANDS) -> list[list[int]]:
+    # Groups texts whose estimated Jaccard similarity is at least threshold,
+    # so reworded free-text messages land together. Word overlap alone is not
+    # enough: "Failed password for <*>" and "Accepted password for <*>" share
+    # most bigrams, so texts of different polarity() never merge (a cluster
+    # has a single polarity, so this cannot chain). Only texts sharing an LSH
+    # bucket are compared, so the cost grows with the number of
+    # near-duplicates rather than with len(texts) squared.
+    # Returns member indices per cluster in first-seen order; the first
+    # member of each cluster is its representative.
+    rows = num_perm // bands
+    signatures = [minhash(text, num_perm) for text in texts]
+    polarities = [polarity(text) for text in texts]
+
+    parent = list(range(len(texts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for band in range(bands):
+        buckets: dict[tuple[int, ...], list[int]] = {}
+        for i, signature in enumerate(signatures):
+            buckets.setdefault(signature[band * rows:(band + 1) * rows], []).append(i)
+        for bucket in buckets.values():
+            for i, j in combinations(bucket, 2):
+                root_i, root_j = find(i), find(j)
+                if root_i == root_j or polarities[i] != polarities[j]:
+                    continue
+                if estimated_jaccard(signatures[i], signatures[j]) < threshold:
+                    continue
+                # Lower index stays root so the earliest text represents the cluster
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+
+    clusters: dict[int, list[int]] = {}
+    for i in range(len(texts)):
+        clusters.setdefault(find(i), []).append(i)
+    return list(clusters.values())
+
+
+def expand_cluster_results(clusters: list[list[int]], texts: list[str], classified: list[dict]) -> list[dict]:
+    # Fan the representative's classification out to every member text, in
+    # text order. Matched by echoed "log" text only; an item that matches no
+    # representative is left out rather than guessed.
+    by_text = {texts[members[0]]: n for n, members in enumerate(clusters)}
+    results: dict[int, dict] = {}
+    unmatched = 0
+    for item in classified:
+        n = by_text.get(item.get("log", ""))
+        if n is None:
+            unmatched += 1
+            continue
+        results.setdefault(n, item)
+    if unmatched:
+        print(f"[CLUSTERS] {unmatched} classified items matched no cluster and were dropped")
+
+    expanded: dict[int, dict] = {}
+    for n, members in enumerate(clusters):
+        item = results.get(n)
+        if item is not None:
+            for i in members:
+                expanded[i] = {**item, "log": texts[i]}
+    return [expanded[i] for i in sorted(expanded)]
@@ -0,0 +1,231 @@
+# log_ingest.py
+
+import bz2
+import codecs
+import gzip
+import json
+import lzma
+import re
+import zipfile
+from typing import Any, BinaryIO, Iterable, Iterator
+
+from timestamps import TimestampRecognizer, label_line, split_label
+
+# Uploads are read in fixed-size byte chunks so no stage ever holds a whole
+# file (or the whole corpus) as a single bytes/str object.
+CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# Single-stream compression formats, decompressed lazily as chunks are read
+_DECOMPRESSORS = {
+    ".gz": lambda f: gzip.GzipFile(fileobj=f, mode="rb"),
+    ".bz2": lambda f: bz2.BZ2File(f, mode="rb"),
+    ".xz": lambda f: lzma.LZMAFile(f, mode="rb"),
+}
+COMPRESSED_EXTENSIONS = tuple(_DECOMPRESSORS) + (".zip",)
+
+# Multi-line records: continuation lines are joined onto the line that opened
+# the record, capped so a runaway dump cannot swallow the rest of a file
+MAX_RECORD_LINES = 50
+RECORD_JOINER = " | "
+# Untimestamped lines that always continue the open record (stack frames,
+# "Caused by", Python tracebacks, wrapped/indented text)
+_CONTINUATION_RE = re.compile(
+    r"^(?:\s|at\s|Caused by:|\.\.\. \d+ (?:more|common frames omitted)|Traceback \(|File \"|"
+    r"[\w.$]+(?:Error|Exception)\b:?)"
+)
+
+# Characters str.splitlines() treats as line boundaries
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+# json.dumps escapes the control characters among them but not these
+_JSON_LINE_BREAK_ESCAPES = str.maketrans({c: f"\\u{ord(c):04x}" for c in "\x85\u2028\u2029"})
+
+
+# --- Raw byte chunks ---
+def iter_chunks(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE, hasher=None) -> Iterator[bytes]:
+    # hasher (e.g. hashlib.md5()) is fed every chunk, fingerprinting the upload
+    # during ingestion instead of in a separate full read
+    _rewind(fileobj)
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            if hasher is not None:
+                hasher.update(chunk)
+            yield chunk
+    finally:
+        _rewind(fileobj)  # leave the upload rewound for any later reader
+
+
+def _rewind(fileobj: BinaryIO):
+    if fileobj.seekable():
+        fileobj.seek(0)
+
+
+# --- Compressed uploads ---
+def iter_upload_sources(fileobj: BinaryIO, name: str) -> Iterator[tuple[str, BinaryIO]]:
+    # Yields (source name, binary stream) pairs. Compressed uploads come back as
+    # decompressing streams so memory stays bounded by the chunk size; each zip
+    # member (itself possibly compressed) is its own source.
+    lowered = name.lower()
+    _rewind(fileobj)
+
+    if lowered.endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                with archive.open(info) as member:
+                    yield from iter_upload_sources(member, info.filename)
+        return
+
+    for ext, opener in _DECOMPRESSORS.items():
+        if lowered.endswith(ext):
+            with opener(fileobj) as stream:
+                # "auth.log.gz" is labeled (and typed) as "auth.log"
+                yield from iter_upload_sources(stream, name[:-len(ext)])
+            return
+
+    yield name, fileobj
+
+
+# --- Decoded lines ---
+def iter_text_lines(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8", hasher=None) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+
+    for chunk in iter_chunks(fileobj, chunk_size, hasher):
+        text = pending + decoder.decode(chunk)
+        if not text:
+            continue
+        lines = text.splitlines()
+        last_char = text[-1]
+        if last_char == "\r":
+            # Could be the first half of a "\r\n" split across two chunks
+            pending = lines.pop() + "\r"
+        elif last_char in _LINE_BREAKS:
+            pending = ""
+        else:
+            pending = lines.pop()
+        yield from lines
+
+    tail = pending + decoder.decode(b"", final=True)
+    yield from tail.splitlines()
+
+
+# --- Labeled line records ---
+def is_content_line(line: str) -> bool:
+    stripped = line.strip()
+    return bool(stripped) and stripped not in ("[", "]")
+
+
+def iter_labeled_lines(fileobj: BinaryIO, label: str, chunk_size: int = CHUNK_SIZE, hasher=None) -> Iterator[str]:
+    for line in iter_text_lines(fileobj, chunk_size, hasher=hasher):
+        if is_content_line(line):
+            yield label_line(label, line)
+
+
+# --- JSON / NDJSON event records ---
+# Fields checked (in order) for an event timestamp to lead the compact record
+_TIMESTAMP_FIELDS = ("timestamp", "@timestamp", "time", "ts", "eventTime", "date")
+# Whitespace and array punctuation between top-level records
+_RECORD_SEPARATORS = " \t\r\n,[]"
+
+
+def iter_json_records(fileobj: BinaryIO, chunk_size: int = CHUNK_SIZE, hasher=None) -> Iterator[Any]:
+    # Incrementally parses a top-level JSON array, NDJSON, or concatenated
+    # documents; only the record being decoded is ever buffered
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    chunks = iter_chunks(fileobj, chunk_size, hasher)
+    buf = ""
+    pos = 0
+    eof = False
+
+    while True:
+        while pos < len(buf) and buf[pos] in _RECORD_SEPARATORS:
+            pos += 1
+
+        need_more = pos >= len(buf)
+        if not need_more:
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+                # A bare number at the end of the buffer may still be incomplete
+                need_more = end == len(buf) and not eof and not isinstance(record, (dict, list))
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                need_more = True
+
+        if need_more:
+            if eof:
+                return
+            chunk = next(chunks, None)
+            if chunk is None:
+                eof = True
+                buf = buf[pos:] + text_decoder.decode(b"", final=True)
+            else:
+                buf = buf[pos:] + text_decoder.decode(chunk)
+            pos = 0
+            continue
+
+        pos = end
+        yield record
+
+
+def compact_event(record: Any) -> str:
+    # One line per event, also for str.splitlines(); the timestamp leads so the
+    # sort and timeline stages recognise it like any other log line
+    body = json.dumps(record, separators=(",", ":"), ensure_ascii=False).translate(_JSON_LINE_BREAK_ESCAPES)
+    if isinstance(record, dict):
+        for field in _TIMESTAMP_FIELDS:
+            ts = record.get(field)
+            if isinstance(ts, str) and ts.strip() and len(ts.splitlines()) == 1:
+                return f"{ts.strip()} {body}"
+    return body
+
+
+def iter_json_events(fileobj: BinaryIO, label: str | None = None, chunk_size: int = CHUNK_SIZE,
+                     hasher=None) -> Iterator[str]:
+    for record in iter_json_records(fileobj, chunk_size, hasher):
+        event = compact_event(record)
+        yield label_line(label, event) if label else event
+
+
+def parse_json_event(line: str) -> Any:
+    # Inverse of compact_event for a (possibly labeled) event line
+    start = line.find("{")
+    if start == -1:
+        raise ValueError("no JSON object in line")
+    record, _ = json.JSONDecoder().raw_decode(line, start)
+    return record
+
+
+# --- Multi-line record assembly ---
+def assemble_records(lines: Iterable[str], recognizer: TimestampRecognizer | None = None,
+                     max_lines: int = MAX_RECORD_LINES) -> Iterator[str]:
+    # Untimestamped lines matching the continuation rules (indentation, stack
+    # frames, tracebacks) join the open record of their source; any other line
+    # opens a record of its own, so unrelated untimestamped lines stay apart.
+    recognizer = recognizer or TimestampRecognizer()
+    open_records: dict[str | None, list[str]] = {}
+
+    for line in lines:
+        match = recognizer.match(line)
+        source = match.source if match else split_label(line)[0]
+        current = open_records.get(source)
+
+        if not match:
+            text = split_label(line)[1]
+            continues = current is not None and len(current) < max_lines and _CONTINUATION_RE.match(text)
+            if continues:
+                if text.strip():
+                    current.append(text.strip())
+                continue
+
+        if current:
+            yield RECORD_JOINER.join(current)
+        open_records[source] = [line]
+
+    for current in open_records.values():
+        yield RECORD_JOINER.join(current)
@@ -0,0 +1,131 @@
+# log_reader.py
+
+import mmap
+import os
+import tempfile
+import weakref
+from array import array
+from typing import Iterable, Iterator
+
+
+# --- Memory-mapped log file with a line-offset index ---
+class MappedLogFile:
+    # Maps a log file read-only and indexes line starts once, so any line can be
+    # fetched by number as a zero-copy memoryview instead of re-splitting text.
+    # Indexing and iteration give decoded lines, so it stands in for a list of
+    # lines. A file made with delete=True is removed once it is closed or
+    # garbage-collected.
+
+    def __init__(self, path: str, encoding: str = "utf-8", delete: bool = False):
+        self.path = path
+        self.encoding = encoding
+        self._remove = weakref.finalize(self, _remove_file, path) if delete else None
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+
+        if self.size:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mm)
+        else:
+            # mmap cannot map an empty file
+            self._mm = None
+            self._view = memoryview(b"")
+
+        self._offsets = self._build_index()
+
+    def _build_index(self) -> array:
+        # 4-byte offsets are enough below 4 GiB; fall back to 8-byte ones above
+        offsets = array("I" if self.size < 2**32 else "Q")
+        if not self.size:
+            return offsets
+
+        find = self._mm.find
+        pos = 0
+        while pos < self.size:
+            offsets.append(pos)
+            nl = find(b"\n", pos)
+            if nl == -1:
+                break
+            pos = nl + 1
+        return offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _span(self, index: int) -> tuple[int, int]:
+        start = self._offsets[index]
+        end = self._offsets[index + 1] if index + 1 < len(self._offsets) else self.size
+        # Drop the line terminator ("\n" or "\r\n")
+        if end > start and self._view[end - 1] == 0x0A:
+            end -= 1
+        if end > start and self._view[end - 1] == 0x0D:
+            end -= 1
+        return start, end
+
+    def line(self, index: int) -> memoryview:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("line index out of range")
+        start, end = self._span(index)
+        return self._view[start:end]
+
+    def text(self, index: int) -> str:
+        return str(self.line(index), self.encoding, errors="replace")
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [self.text(i) for i in range(*index.indices(len(self)))]
+        return self.text(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_text()
+
+    def iter_lines(self, start: int = 0, stop: int | None = None) -> Iterator[memoryview]:
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self.line(index)
+
+    def iter_text(self, start: int = 0, stop: int | None = None) -> Iterator[str]:
+        for view in self.iter_lines(start, stop):
+            yield str(view, self.encoding, errors="replace")
+
+    def close(self):
+        # Line views handed out must be released (or dropped) before closing
+        self._view.release()
+        if self._mm is not None:
+            self._mm.close()
+        self._file.close()
+        if self._remove:
+            self._remove()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Spooled corpora ---
+def spool_lines(lines: Iterable[str], directory: str | None = None) -> MappedLogFile:
+    # Writes lines to a temporary file as they arrive and maps it, so a corpus
+    # is held on disk rather than as a list of strings. Lines must not contain
+    # "\n"; ingested records never do.
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", errors="replace", newline="\n",
+                                     suffix=".log", dir=directory, delete=False) as spool:
+        try:
+            for line in lines:
+                spool.write(line)
+                spool.write("\n")
+        except BaseException:
+            spool.close()
+            _remove_file(spool.name)
+            raise
+    return MappedLogFile(spool.name, delete=True)
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
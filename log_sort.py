@@ -0,0 +1,157 @@
+# log_sort.py
+
+import heapq
+import os
+import pickle
+import tempfile
+from datetime import datetime
+from operator import itemgetter
+from typing import Iterable, Iterator
+
+from timestamps import TimestampRecognizer, split_label, to_datetime
+
+# Memory ceiling for in-memory sorting; larger inputs spill sorted runs to disk
+SORT_MEMORY_LIMIT = int(os.getenv("FORENSIQ_SORT_MEMORY_MB", "256")) * 1024 * 1024
+# Rough per-record cost of a (datetime, str, ...) tuple on top of its text
+_RECORD_OVERHEAD = 120
+
+
+# --- Per-source runs ---
+def source_label(line: str) -> str | None:
+    return split_label(line)[0]
+
+
+def split_sources(log_lines: Iterable[str]) -> dict[str | None, list[str]]:
+    sources: dict[str | None, list[str]] = {}
+    for line in log_lines:
+        sources.setdefault(source_label(line), []).append(line)
+    return sources
+
+
+def keyed_lines(lines: Iterable[str]) -> Iterator[tuple[datetime, str]]:
+    # Parse each timestamp once; lines without one inherit the previous key of
+    # the same source so continuation lines stay attached to the event above them
+    recognizer = TimestampRecognizer()
+    last_keys: dict[str | None, datetime] = {}
+    for line in lines:
+        match = recognizer.match(line)
+        key = to_datetime(match.timestamp, match.format) if match else None
+        label = match.source if match else source_label(line)
+        if key is None:
+            key = last_keys.get(label, datetime.min)
+        else:
+            last_keys[label] = key
+        yield key, line
+
+
+def keyed_run(lines: Iterable[str]) -> list[tuple[datetime, str]]:
+    return list(keyed_lines(lines))
+
+
+def estimated_size(lines: Iterable[str]) -> int:
+    return sum(len(line) + _RECORD_OVERHEAD for line in lines)
+
+
+def record_size(record: tuple) -> int:
+    # Every text field counts, not just the line: records may carry more
+    return sum(len(field) for field in record if isinstance(field, str)) + _RECORD_OVERHEAD
+
+
+def disorder_ratio(run: list[tuple[datetime, str]]) -> float:
+    if len(run) < 2:
+        return 0.0
+    descents = sum(1 for a, b in zip(run, run[1:]) if b[0] < a[0])
+    return descents / (len(run) - 1)
+
+
+# --- External-memory sort ---
+def _write_spill(run: list[tuple], tmp_dir: str | None):
+    spill = tempfile.TemporaryFile("w+b", dir=tmp_dir)
+    pickler = pickle.Pickler(spill, protocol=pickle.HIGHEST_PROTOCOL)
+    for record in run:
+        pickler.dump(record)
+        pickler.clear_memo()
+    spill.seek(0)
+    return spill
+
+
+def _read_spill(spill) -> Iterator[tuple]:
+    # Spills are our own temporary files, written by _write_spill
+    unpickler = pickle.Unpickler(spill)
+    while True:
+        try:
+            yield unpickler.load()
+        except EOFError:
+            return
+
+
+def external_sort_keyed(records: Iterable[tuple], memory_limit: int = SORT_MEMORY_LIMIT,
+                        tmp_dir: str | None = None) -> Iterator[tuple]:
+    # Sort bounded runs in memory, spill each to a temp file, then stream-merge
+    # the files; peak memory stays around memory_limit regardless of input size.
+    # Records are (key, line, ...) tuples sorted on key; any further fields are
+    # carried through. Ties keep input order.
+    spills = []
+    run = []
+    run_size = 0
+    try:
+        for record in records:
+            run.append(record)
+            run_size += record_size(record)
+            if run_size >= memory_limit:
+                run.sort(key=itemgetter(0))
+                spills.append(_write_spill(run, tmp_dir))
+                run = []
+                run_size = 0
+
+        run.sort(key=itemgetter(0))
+        if not spills:
+            yield from run
+            return
+        if run:
+            spills.append(_write_spill(run, tmp_dir))
+        run = []
+
+        yield from heapq.merge(*(_read_spill(s) for s in spills), key=itemgetter(0))
+    finally:
+        for spill in spills:
+            spill.close()
+
+
+def external_sort(lines: Iterable[str], memory_limit: int = SORT_MEMORY_LIMIT,
+                  tmp_dir: str | None = None) -> Iterator[str]:
+    for _, line in external_sort_keyed(keyed_lines(lines), memory_limit, tmp_dir):
+        yield line
+
+
+# --- k-way merge ---
+def merge_records(runs: Iterable[Iterable[tuple]]) -> Iterator[tuple]:
+    # O(N log k) heap merge of runs sorted on their first field; ties keep
+    # run order, then record order
+    return heapq.merge(*runs, key=itemgetter(0))
+
+
+def merge_runs(runs: Iterable[Iterable[tuple[datetime, str]]]) -> Iterator[str]:
+    for _, line in merge_records(runs):
+        yield line
+
+
+def merge_sources(sources: Iterable[Iterable[str]]) -> Iterator[str]:
+    # In-memory only: sort_log_lines sends inputs above the ceiling to the
+    # external sort, so no single source needs one
+    runs = []
+    for lines in sources:
+        run = keyed_run(lines)
+        if disorder_ratio(run):
+            # Timsort is close to linear on the nearly sorted runs logs usually are
+            run.sort(key=itemgetter(0))
+        runs.append(run)
+    return merge_runs(runs)
+
+
+def sort_log_lines(log_lines: Iterable[str], memory_limit: int = SORT_MEMORY_LIMIT) -> Iterator[str]:
+    # In-memory inputs under the ceiling take the per-source merge; anything
+    # larger (or a one-shot stream) goes through the spill-to-disk sort
+    if isinstance(log_lines, list) and estimated_size(log_lines) <= memory_limit:
+        return merge_sources(split_sources(log_lines).values())
+    return external_sort(log_lines, memory_limit)
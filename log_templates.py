@@ -0,0 +1,174 @@
+# log_templates.py
+
+import re
+from typing import Iterable
+
+from timestamps import TimestampRecognizer, split_label
+
+PARAM = "<*>"
+# Tokens that are almost always parameters, masked before tree lookup
+_MASK_RE = re.compile(
+    r"\[IP_REDACTED\]|\[USER\]|\[FILE_PATH\]"
+    r"|\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"
+    r"|\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b"
+    r"|\b0x[0-9a-fA-F]+\b"
+    r"|\b[0-9a-fA-F]{16,}\b"
+    r"|(?<![\w.])[-+]?\d+(?:\.\d+)?(?:ms|s|%|kb|mb|gb)?(?![\w.])"
+)
+_HAS_DIGIT_RE = re.compile(r"\d")
+# Who and where an event names (user, account and host values), which differ
+# between incidents; masked in event_template only
+_IDENTITY_RE = re.compile(
+    r"\b((?:password|publickey|keyboard-interactive/pam|hostbased) for (?:invalid user )?"
+    r"|(?:invalid |for )?user[= ]|(?:uid|euid|ruser|rhost|host|logname|account|username)=)([^\s,;:=()\[\]]+)"
+    r"|(?<=@)[\w.-]+",
+    re.IGNORECASE,
+)
+
+# Drain parameters: prefix depth used to route lines, and minimum share of
+# matching tokens for a line to join an existing template
+TREE_DEPTH = 3
+SIMILARITY_THRESHOLD = 0.5
+
+
+class LogTemplate:
+    def __init__(self, template_id: int, tokens: list[str], index: int, line: str, timestamp: str | None):
+        self.id = template_id
+        self.tokens = tokens
+        self.count = 0
+        self.members: list[int] = []
+        self.sample = line  # first original line, kept verbatim
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.add(index, timestamp)
+
+    @property
+    def text(self) -> str:
+        return " ".join(self.tokens)
+
+    def add(self, index: int, timestamp: str | None):
+        self.count += 1
+        self.members.append(index)
+        if timestamp:
+            self.first_seen = self.first_seen or timestamp
+            self.last_seen = timestamp
+
+
+# --- Drain-style online miner ---
+class TemplateMiner:
+    # Lines are routed by token count and their first TREE_DEPTH tokens to a
+    # small list of candidate templates, so each line is compared against a
+    # handful of templates rather than all of them.
+
+    def __init__(self, depth: int = TREE_DEPTH, similarity: float = SIMILARITY_THRESHOLD):
+        self.depth = depth
+        self.similarity = similarity
+        self.templates: list[LogTemplate] = []
+        self._tree: dict[tuple, list[LogTemplate]] = {}
+        self.assignments: list[int] = []  # template id per added line
+
+    @staticmethod
+    def tokenize(message: str) -> list[str]:
+        return _MASK_RE.sub(PARAM, message).split()
+
+    def _route(self, tokens: list[str]) -> tuple:
+        prefix = tuple(PARAM if _HAS_DIGIT_RE.search(t) else t for t in tokens[:self.depth])
+        return (len(tokens),) + prefix
+
+    def _best_match(self, candidates: list[LogTemplate], tokens: list[str]) -> LogTemplate | None:
+        best, best_score = None, -1.0
+        for template in candidates:
+            same = sum(1 for a, b in zip(template.tokens, tokens) if a == b and a != PARAM)
+            params = template.tokens.count(PARAM)
+            # Params count as neither agreement nor disagreement
+            score = same / max(len(tokens) - params, 1) if len(tokens) > params else 1.0
+            if score > best_score or (score == best_score and best is not None and params < best.tokens.count(PARAM)):
+                best, best_score = template, score
+        return best if best is not None and best_score >= self.similarity else None
+
+    def add(self, message: str, line: str | None = None, timestamp: str | None = None) -> LogTemplate:
+        index = len(self.assignments)
+        tokens = self.tokenize(message) or [message]
+        candidates = self._tree.setdefault(self._route(tokens), [])
+
+        template = self._best_match(candidates, tokens)
+        if template is None:
+            template = LogTemplate(len(self.templates), tokens, index, line or message, timestamp)
+            self.templates.append(template)
+            candidates.append(template)
+        else:
+            template.tokens = [a if a == b else PARAM for a, b in zip(template.tokens, tokens)]
+            template.add(index, timestamp)
+
+        self.assignments.append(template.id)
+        return template
+
+
+def mine_templates(log_lines: Iterable[str], recognizer: TimestampRecognizer | None = None) -> TemplateMiner:
+    # Templates are mined from the message only: source label and timestamp
+    # are stripped so the same event from two files lands in one template
+    recognizer = recognizer or TimestampRecognizer()
+    miner = TemplateMiner()
+    for line in log_lines:
+        match = recognizer.match(line)
+        if match:
+            miner.add(match.message, line, match.timestamp)
+        else:
+            miner.add(split_label(line)[1], line)
+    return miner
+
+
+def event_template(line: str, recognizer: TimestampRecognizer | None = None) -> str:
+    # Masked form of one event, independent of the corpus it came from (mined
+    # templates depend on which other lines were seen): label and timestamp
+    # stripped, parameters masked, and so are identities: user and host
+    # values, the syslog host field, and any token with a digit in it (the
+    # tokens TemplateMiner routes as parameters), so "user0" and "alice0" agree
+    match = (recognizer or TimestampRecognizer()).match(line)
+    message = match.message if match else split_label(line)[1]
+    message = _IDENTITY_RE.sub(lambda m: f"{m.group(1)}{PARAM}" if m.group(1) else PARAM, message)
+    tokens = [PARAM if _HAS_DIGIT_RE.search(t) else t for t in TemplateMiner.tokenize(message)]
+    if match and match.format == "syslog" and tokens:
+        tokens[0] = PARAM  # "Mar  1 10:00:00 <host> sshd[42]: ..."
+    return " ".join(tokens) or message.strip()
+
+
+# --- LLM input / output ---
+def representative_line(template: LogTemplate) -> str:
+    # What the LLM sees for a template: its first occurrence, plus counts and
+    # time span when the template repeats
+    if template.count == 1:
+        return template.sample
+    span = f" between {template.first_seen} and {template.last_seen}" if template.first_seen else ""
+    return f"{template.sample} [seen {template.count}x{span}; pattern: {template.text}]"
+
+
+def collapse_lines(log_lines: list[str], miner: TemplateMiner | None = None) -> list[str]:
+    # One line per template in first-seen order; singletons pass through verbatim
+    miner = miner or mine_templates(log_lines)
+    return [representative_line(template) for template in miner.templates]
+
+
+def expand_classifications(miner: TemplateMiner, log_lines: list[str], classified: list[dict]) -> list[dict]:
+    # Fan each template's classification back out to every member line, in the
+    # original line order. Results are matched to templates by their echoed
+    # "log" text only; an item that matches no template is left out rather
+    # than guessed, so its lines stay unclassified.
+    by_text = {representative_line(t): t.id for t in miner.templates}
+    results: dict[int, dict] = {}
+    unmatched = 0
+    for item in classified:
+        template_id = by_text.get(item.get("log", ""))
+        if template_id is None:
+            unmatched += 1
+            continue
+        results.setdefault(template_id, item)
+    if unmatched:
+        print(f"[TEMPLATES] {unmatched} classified items matched no template and were dropped")
+
+    expanded = []
+    for line, template_id in zip(log_lines, miner.assignments):
+        item = results.get(template_id)
+        if item is not None:
+            expanded.append({**item, "log": line, "template_id": template_id})
+    return expanded
@@ -0,0 +1,164 @@
+# log_triage.py
+
+import math
+import os
+import re
+from datetime import datetime
+from typing import NamedTuple
+
+from timestamps import TimestampMatch, TimestampRecognizer, split_label, to_datetime
+
+# Width of a triage window per source
+TRIAGE_WINDOW_SECONDS = int(os.getenv("FORENSIQ_TRIAGE_WINDOW_SECONDS", "60"))
+# Smoothing of the per-source baselines windows are compared against
+BASELINE_ALPHA = 0.3
+
+_ERROR_RE = re.compile(
+    r"(?i)\b(?:error|fail(?:ed|ure)?|denied|forbidden|unauthori[sz]ed|refused|invalid|reject(?:ed)?|blocked"
+    r"|critical|fatal|alert|panic|exception|malware|attack)\b")
+_LEVEL_RE = re.compile(r"\b(DEBUG|INFO|NOTICE|WARN(?:ING)?|ERR(?:OR)?|CRIT(?:ICAL)?|ALERT|EMERG|FATAL)\b")
+_LEVELS = {"DEBUG": 0, "INFO": 1, "NOTICE": 1, "WARN": 2, "WARNING": 2, "ERR": 3, "ERROR": 3,
+           "CRIT": 4, "CRITICAL": 4, "ALERT": 5, "EMERG": 5, "FATAL": 5}
+_LEVEL_NAMES = ["DEBUG", "INFO", "WARN", "ERROR", "CRITICAL", "FATAL"]
+# Things whose first appearance is worth noticing: addresses, accounts, hosts, paths
+_ENTITY_RE = re.compile(
+    r"\b(?:\d{1,3}\.){3}\d{1,3}\b"
+    r"|\b[\w.+-]+@[\w-]+\.[\w.-]+\b"
+    r"|(?i:\b(?:user(?:name)?|account|host|for)[=: ]+\"?)([\w.\-\\$]+)"
+    r"|[a-zA-Z]:\\[^\s\"]+"
+)
+
+
+class TriageWindow(NamedTuple):
+    source: str | None
+    start: datetime | None
+    first_line: int
+    last_line: int
+    score: float
+    reasons: str
+
+
+class TriageResult(NamedTuple):
+    scores: list[float]           # per input line, higher is more anomalous
+    windows: list[TriageWindow]   # most anomalous first
+
+
+class _Window:
+    __slots__ = ("source", "start", "lines", "events", "errors", "new_entities", "level", "score")
+
+    def __init__(self, source, start):
+        self.source = source
+        self.start = start
+        self.lines: list[int] = []
+        self.events = 0
+        self.errors = 0
+        self.new_entities = 0
+        self.level = 0
+        self.score = 0.0
+
+
+class _Baseline:
+    # Exponentially weighted mean and variance of one per-window measure
+    __slots__ = ("mean", "var", "seen")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.seen = False
+
+    def zscore(self, value: float) -> float:
+        # Scores against the history so far, then folds the value in
+        if not self.seen:
+            self.mean, self.seen = value, True
+            return 0.0
+        z = (value - self.mean) / math.sqrt(self.var + 1.0)
+        delta = value - self.mean
+        self.mean += BASELINE_ALPHA * delta
+        self.var = (1 - BASELINE_ALPHA) * (self.var + BASELINE_ALPHA * delta * delta)
+        return z
+
+
+def triage(log_lines: list[str], matches: list[TimestampMatch | None] | None = None,
+           window_seconds: int = TRIAGE_WINDOW_SECONDS) -> TriageResult:
+    # One pass to bucket lines into per-source windows and count events,
+    # errors/denies, first-seen entities and the highest level; a second pass
+    # over the windows scores each against its source's running baseline.
+    # Both passes are linear in the number of lines.
+    if matches is None:
+        matches = TimestampRecognizer().match_lines(log_lines)
+
+    windows: dict[tuple[str | None, int | None], _Window] = {}
+    last_bucket: dict[str | None, int | None] = {}
+    line_window: list[_Window] = []
+    line_flags: list[float] = []
+    entities: set[str] = set()
+    first_window: dict[str | None, _Window] = {}
+
+    for i, (line, match) in enumerate(zip(log_lines, matches)):
+        ts = to_datetime(match.timestamp, match.format) if match else None
+        source = match.source if match else split_label(line)[0]
+        if ts is not None:
+            bucket = int((ts - datetime(1970, 1, 1)).total_seconds() // window_seconds)
+            last_bucket[source] = bucket
+        else:
+            # Continuation lines stay in the window of the event above them
+            bucket = last_bucket.get(source)
+
+        window = windows.get((source, bucket))
+        if window is None:
+            window = windows[(source, bucket)] = _Window(source, ts)
+        window.lines.append(i)
+        window.events += 1
+
+        flag = 0.0
+        if _ERROR_RE.search(line):
+            window.errors += 1
+            flag += 1.0
+        level = _LEVEL_RE.search(line)
+        if level:
+            severity = _LEVELS[level.group(1)]
+            window.level = max(window.level, severity)
+            flag += severity / 2
+        fresh = 0
+        for m in _ENTITY_RE.finditer(line):
+            entity = (m.group(1) or m.group(0)).lower()
+            if entity not in entities:
+                entities.add(entity)
+                fresh += 1
+        # A source's first window only establishes what is normal
+        if fresh and first_window.setdefault(source, window) is not window:
+            window.new_entities += fresh
+            flag += 1.0
+        line_window.append(window)
+        line_flags.append(flag)
+
+    baselines: dict[str | None, tuple[_Baseline, _Baseline, _Baseline]] = {}
+    ranked = []
+    for window in windows.values():
+        rate, errors, level = baselines.setdefault(window.source, (_Baseline(), _Baseline(), _Baseline()))
+        rate_z = max(rate.zscore(window.events), 0.0)
+        error_z = max(errors.zscore(window.errors), 0.0)
+        level_jump = max(window.level - level.mean, 0.0) if level.seen else 0.0
+        level.zscore(window.level)
+        window.score = rate_z + 2 * error_z + 1.5 * math.log1p(window.new_entities) + level_jump
+
+        reasons = []
+        if rate_z >= 2:
+            reasons.append(f"event rate {window.events} (z={rate_z:.1f})")
+        if error_z >= 2:
+            reasons.append(f"{window.errors} errors/denies (z={error_z:.1f})")
+        if window.new_entities:
+            reasons.append(f"{window.new_entities} new entities")
+        if level_jump >= 1:
+            reasons.append(f"level up to {_LEVEL_NAMES[window.level]}")
+        ranked.append(TriageWindow(window.source, window.start, window.lines[0], window.lines[-1],
+                                   round(window.score, 2), "; ".join(reasons)))
+
+    ranked.sort(key=lambda w: -w.score)
+    scores = [window.score + flag for window, flag in zip(line_window, line_flags)]
+    return TriageResult(scores, ranked)
+
+
+def group_scores(groups: list[list[int]], scores: list[float]) -> list[float]:
+    # A group (template, cluster) is as interesting as its most anomalous member
+    return [max((scores[i] for i in members), default=0.0) for members in groups]
@@ -0,0 +1,60 @@
+# log_windows.py
+
+import os
+from datetime import datetime
+from typing import NamedTuple
+
+from timestamps import TimestampRecognizer, to_datetime
+from token_budget import count_tokens_lines
+
+# Width of a map-reduce analysis window. Windows start on multiples of this
+# (counted from the epoch), so appending logs leaves earlier windows unchanged.
+WINDOW_MINUTES = int(os.getenv("FORENSIQ_WINDOW_MINUTES", "60"))
+
+
+class LogWindow(NamedTuple):
+    start: datetime | None
+    end: datetime | None
+    lines: list[str]
+
+    def label(self) -> str:
+        if self.start is None:
+            return "untimed"
+        return f"{self.start.isoformat(sep=' ')} to {self.end.isoformat(sep=' ')}"
+
+
+def split_time_windows(log_lines: list[str], token_budget: int, minutes: int = WINDOW_MINUTES) -> list[LogWindow]:
+    # Cuts the time-ordered stream wherever it crosses a window boundary, and
+    # also inside a window wherever it would exceed token_budget. Lines without
+    # a timestamp stay in the window of the event before them.
+    recognizer = TimestampRecognizer()
+    width = max(minutes, 1) * 60
+    tokens = count_tokens_lines(log_lines)
+
+    windows: list[LogWindow] = []
+    lines: list[str] = []
+    used = 0
+    bucket = None
+    start = end = None
+
+    def close():
+        if lines:
+            windows.append(LogWindow(start, end, lines))
+
+    for line, cost in zip(log_lines, tokens):
+        match = recognizer.match(line)
+        ts = to_datetime(match.timestamp, match.format) if match else None
+        line_bucket = int((ts - datetime(1970, 1, 1)).total_seconds() // width) if ts else bucket
+
+        if lines and (line_bucket != bucket or used + cost + 1 > token_budget):
+            close()
+            lines, used, start, end = [], 0, None, None
+
+        lines.append(line)
+        used += cost + 1
+        bucket = line_bucket
+        if ts:
+            start = start or ts
+            end = ts
+    close()
+    return windows
@@ -0,0 +1,139 @@
+# parallel_preprocess.py
+
+import os
+from array import array
+from collections.abc import Sized
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+from typing import Iterable, Iterator, NamedTuple
+
+from log_reader import MappedLogFile, spool_lines
+from log_sort import SORT_MEMORY_LIMIT, external_sort_keyed
+from redaction import Redactor
+from timestamps import TimestampRecognizer, format_code, split_label, to_datetime
+
+# Worker processes for preprocessing; 1 keeps everything in-process
+PARALLEL_WORKERS = int(os.getenv("FORENSIQ_WORKERS", str(os.cpu_count() or 1)))
+# Below this many lines the pool's start-up and pickling cost more than it saves
+PARALLEL_MIN_LINES = int(os.getenv("FORENSIQ_PARALLEL_MIN_LINES", "50000"))
+# Lines per task handed to a worker
+CHUNK_LINES = 20000
+# Chunks queued per worker; bounds how much of the input is in flight at once
+CHUNKS_IN_FLIGHT = 2
+
+
+class PreprocessResult(NamedTuple):
+    lines: MappedLogFile        # time-ordered, redacted in Safe Mode; spooled to disk
+    formats: array              # format code per line (timestamps.format_code), same order
+    redactions: dict[str, int]
+
+
+class ChunkResult(NamedTuple):
+    head: list[tuple[str | None, str, int]]  # lines before their source's first timestamp
+    run: list[tuple[datetime, str, int]]     # everything else, sorted by key
+    last_keys: dict[str | None, datetime]    # last timestamp per source in the chunk
+    redactions: dict[str, int]
+
+
+# --- Worker ---
+def _preprocess_chunk(lines: list[str], safe_mode: bool) -> ChunkResult:
+    # Redact, match and sort one chunk. Each line is matched once, after
+    # redaction (which never touches timestamps), and only its format code is
+    # kept, not the match. Lines the chunk alone cannot place, continuation
+    # lines ahead of their source's first timestamp, are returned separately
+    # for the parent to key from the chunk before.
+    recognizer = TimestampRecognizer()
+    redactor = Redactor()
+    head = []
+    run = []
+    last_keys: dict[str | None, datetime] = {}
+    for line in lines:
+        if safe_mode:
+            line = redactor.redact(line)
+        match = recognizer.match(line)
+        key = to_datetime(match.timestamp, match.format) if match else None
+        source = match.source if match else split_label(line)[0]
+        if key is None:
+            key = last_keys.get(source)
+            if key is None:
+                head.append((source, line, format_code(match)))
+                continue
+        else:
+            last_keys[source] = key
+        run.append((key, line, format_code(match)))
+    # Stable, and close to linear on the nearly sorted runs logs usually are
+    run.sort(key=itemgetter(0))
+    return ChunkResult(head, run, last_keys, redactor.counts)
+
+
+def _chunks(log_lines: Iterable[str], size: int) -> Iterator[list[str]]:
+    lines = iter(log_lines)
+    while chunk := list(islice(lines, size)):
+        yield chunk
+
+
+def _ordered_results(log_lines: Iterable[str], safe_mode: bool, workers: int,
+                     chunk_lines: int) -> Iterator[ChunkResult]:
+    # Chunk results in input order, with at most CHUNKS_IN_FLIGHT per worker
+    # submitted and not yet collected
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in _chunks(log_lines, chunk_lines):
+            pending.append(pool.submit(_preprocess_chunk, chunk, safe_mode))
+            if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+# --- Parent ---
+def _keyed_records(results: Iterable[ChunkResult], redactions: dict[str, int]) -> Iterator[tuple]:
+    # Each chunk's head takes the last key of its source from the chunks
+    # before it, which gives the same keys as a serial pass. Heads precede
+    # their chunk's run, so ties keep input order.
+    last_keys: dict[str | None, datetime] = {}
+    for result in results:
+        for kind, n in result.redactions.items():
+            redactions[kind] = redactions.get(kind, 0) + n
+        if result.head:
+            head = [(last_keys.get(source, datetime.min), line, code) for source, line, code in result.head]
+            head.sort(key=itemgetter(0))
+            yield from head
+        yield from result.run
+        last_keys.update(result.last_keys)
+
+
+def _merge_chunks(results: Iterable[ChunkResult], memory_limit: int) -> PreprocessResult:
+    # The sorted per-chunk runs go through the external sort: under
+    # memory_limit they are merged in memory (Timsort merges the runs as
+    # they are), above it they are spilled to disk and stream-merged, so the
+    # parent never holds more than about memory_limit of pending records.
+    # The merged lines are written straight to a spool file; all that stays
+    # in memory per line is its one-byte format code.
+    redactions: dict[str, int] = {}
+    formats = array("B")
+
+    def merged_lines() -> Iterator[str]:
+        for _, line, code in external_sort_keyed(_keyed_records(results, redactions), memory_limit):
+            formats.append(code)
+            yield line
+
+    lines = spool_lines(merged_lines())
+    return PreprocessResult(lines, formats, redactions)
+
+
+def preprocess_parallel(log_lines: Iterable[str], safe_mode: bool, workers: int = PARALLEL_WORKERS,
+                        min_lines: int = PARALLEL_MIN_LINES, chunk_lines: int = CHUNK_LINES,
+                        memory_limit: int = SORT_MEMORY_LIMIT) -> PreprocessResult:
+    # Streams the corpus in line-aligned chunks to a process pool for
+    # redaction, timestamp matching and sorting, then merges the sorted
+    # per-chunk runs in the parent within memory_limit
+    if isinstance(log_lines, Sized) and len(log_lines) < min_lines:
+        workers = 1
+    if workers <= 1:
+        results = (_preprocess_chunk(chunk, safe_mode) for chunk in _chunks(log_lines, chunk_lines))
+    else:
+        results = _ordered_results(log_lines, safe_mode, workers, chunk_lines)
+    return _merge_chunks(results, memory_limit)
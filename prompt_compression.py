@@ -0,0 +1,116 @@
+# prompt_compression.py
+
+import os
+import re
+from datetime import datetime, timedelta
+
+from redaction import REDACTION_TOKENS
+from timestamps import TimestampRecognizer, split_label, to_datetime
+
+# Set FORENSIQ_COMPRESS_PROMPTS=0 to send log lines exactly as they are
+PROMPT_COMPRESSION = os.getenv("FORENSIQ_COMPRESS_PROMPTS", "1") != "0"
+
+# Absolute timestamps anywhere in a line, beyond the leading one the recognizer sees
+_INLINE_TS_RE = re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?")
+_MARKERS = "|".join(re.escape(token) for token in REDACTION_TOKENS.values())
+_MARKER_RUN_RE = re.compile(rf"({_MARKERS})(?:[ \t]*\1)+")
+_MARKER_COUNT_RE = re.compile(rf"({_MARKERS})x(\d+)")
+_SPACES_RE = re.compile(r"[ \t]{2,}")
+_OFFSET_RE = re.compile(r"T\+(\d+(?:\.\d+)?)")
+_ALIAS_RE = re.compile(r"\[f(\d+)\]")
+# Absolute times written back for offsets, in the form report_sections.timeline_step reads
+RESTORED_TIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+class PromptCompressor:
+    # Rewrites log lines into a shorter notation the model is told about, and
+    # maps the model's output back:
+    #   [auth.log]                   -> [f1]
+    #   2025-06-01 12:05:12          -> T+312 (seconds after the earliest event;
+    #                                   syslog stamps have no year and stay as they are)
+    #   [IP_REDACTED] [IP_REDACTED]  -> [IP_REDACTED]x2
+    # Runs of spaces are collapsed and not restored. Offsets are input-only:
+    # the model is asked for absolute times, and any T+N it still writes is
+    # restored as "YYYY-MM-DDTHH:MM:SS", the ISO form the timeline parses.
+
+    def __init__(self):
+        self.aliases: dict[str, str] = {}
+        self.anchor: datetime | None = None
+        self._offsets: set[str] = set()         # offset tokens handed out
+        self._lines: dict[str, str] = {}       # compressed line -> original line
+
+    # --- Compression ---
+    def compress_lines(self, lines: list[str]) -> list[str]:
+        recognizer = TimestampRecognizer()
+        matches = recognizer.match_lines(lines)
+        # Syslog stamps carry no year and are short already; they keep their form
+        instants = [to_datetime(m.timestamp, m.format) if m and m.format != "syslog" else None for m in matches]
+        for line in lines:
+            for found in _INLINE_TS_RE.finditer(line):
+                instants.append(to_datetime(found.group(0), "iso8601"))
+        known = [ts for ts in instants if ts is not None]
+        # The anchor is fixed once the first offset has been handed out
+        if known and not self._offsets:
+            self.anchor = min(known + ([self.anchor] if self.anchor else []))
+
+        compressed = []
+        for line, match in zip(lines, matches):
+            short = self._compress_line(line, match)
+            self._lines.setdefault(short.strip(), line)
+            compressed.append(short)
+        return compressed
+
+    def _offset_token(self, timestamp: str, fmt: str) -> str | None:
+        ts = to_datetime(timestamp, fmt)
+        if ts is None or self.anchor is None or ts < self.anchor:
+            return None
+        seconds = (ts - self.anchor).total_seconds()
+        token = f"T+{seconds:.6f}".rstrip("0").rstrip(".")
+        self._offsets.add(token)
+        return token
+
+    def _compress_line(self, line: str, match) -> str:
+        source, text = split_label(line)
+        if source is not None:
+            alias = self.aliases.setdefault(source, f"f{len(self.aliases) + 1}")
+            prefix = f"[{alias}] "
+        else:
+            prefix = ""
+
+        if match is not None and match.format == "epoch":
+            token = self._offset_token(match.timestamp, match.format)
+            if token:
+                text = text.replace(match.timestamp, token, 1)
+        text = _INLINE_TS_RE.sub(lambda m: self._offset_token(m.group(0), "iso8601") or m.group(0), text)
+
+        text = _MARKER_RUN_RE.sub(lambda m: f"{m.group(1)}x{m.group(0).count(m.group(1))}", text)
+        return prefix + _SPACES_RE.sub(" ", text)
+
+    def legend(self) -> str:
+        # Notation note placed ahead of the compressed logs
+        parts = []
+        if self.aliases:
+            parts.append("Sources: " + ", ".join(f"[{a}]={s}" for s, a in self.aliases.items()))
+        if self.anchor is not None:
+            parts.append(
+                f"Times in the logs are written T+N, meaning N seconds after T0 = "
+                f"{self.anchor.strftime(RESTORED_TIME_FORMAT)} UTC; in your answer write every time as an "
+                "absolute YYYY-MM-DDTHH:MM:SS timestamp (T0 plus N seconds), never as T+N")
+        parts.append("[IP_REDACTED]x3 means three consecutive redacted values")
+        return "NOTATION: " + ". ".join(parts) + "."
+
+    # --- Restoration ---
+    def _restore_offset(self, m: re.Match) -> str:
+        if self.anchor is None:
+            return m.group(0)
+        return (self.anchor + timedelta(seconds=float(m.group(1)))).strftime(RESTORED_TIME_FORMAT)
+
+    def restore(self, text: str) -> str:
+        names = {alias: source for source, alias in self.aliases.items()}
+        text = _ALIAS_RE.sub(lambda m: f"[{names.get('f' + m.group(1), 'f' + m.group(1))}]", text)
+        text = _OFFSET_RE.sub(self._restore_offset, text)
+        return _MARKER_COUNT_RE.sub(lambda m: " ".join([m.group(1)] * int(m.group(2))), text)
+
+    def restore_line(self, line: str) -> str:
+        # Exact original when the model echoed a compressed line verbatim
+        return self._lines.get(line.strip()) or self.restore(line)
@@ -67,7 +67,9 @@
 import os
 import uuid
 import hashlib
+import threading
 import numpy as np
+from collections import OrderedDict
 import streamlit as st
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
@@ -154,6 +156,37 @@ def build_index_once(log_hash, log_lines):
     build_filtered_index(log_lines)
     return True
 
+# --- Query embeddings per log chunk, computed once per chunk content ---
+CHUNK_QUERY_LINES = 10
+# Chunk vectors kept for the server's lifetime; least recently used go first
+CHUNK_EMBEDDING_CACHE_SIZE = int(os.getenv("FORENSIQ_CHUNK_EMBEDDINGS", "4096"))
+
+@st.cache_resource
+def get_chunk_embeddings():
+    # Shared by every session of the server, hence the lock
+    return OrderedDict(), threading.Lock()
+
+def embed_chunks(chunks, log_lines):
+    cache, lock = get_chunk_embeddings()
+    vectors = {}
+    with lock:
+        for c in chunks:
+            if c.id in cache:
+                cache.move_to_end(c.id)
+                vectors[c.id] = cache[c.id]
+    new = [c for c in chunks if c.id not in vectors]
+    if new:
+        texts = [" ".join(log_lines[c.start:min(c.end, c.start + CHUNK_QUERY_LINES)]) for c in new]
+        for chunk, vector in zip(new, get_model().encode(texts, batch_size=64, show_progress_bar=False)):
+            vectors[chunk.id] = vector
+        with lock:
+            for chunk in new:
+                cache[chunk.id] = vectors[chunk.id]
+                cache.move_to_end(chunk.id)
+            while len(cache) > CHUNK_EMBEDDING_CACHE_SIZE:
+                cache.popitem(last=False)
+    return np.array([vectors[c.id] for c in chunks])
+
 # --- Utility: Get consistent cache key for logs ---
 def get_log_hash(log_lines):
     joined = "\n".join(log_lines[:10])
@@ -161,15 +194,23 @@ def get_log_hash(log_lines):
 
 # --- RAG Wrapper ---
 class ThreatRAG:
-    def __init__(self, log_lines):
+    def __init__(self, log_lines, chunks=None):
         self.log_lines = log_lines
+        self.chunks = chunks  # log_chunks.LogChunk spans over log_lines
 
     def search(self, log_lines=None, top_k=TOP_K):
         log_lines = log_lines or self.log_lines
         try:
             client = get_qdrant_client()
-            model = get_model()
-            query_vec = model.encode(" ".join(log_lines[:10]))
+            if self.chunks:
+                # With chunks the query covers the whole log set: the mean of
+                # one vector per chunk (each from the chunk's first
+                # CHUNK_QUERY_LINES lines) instead of the first 10 lines of
+                # the set. Only chunks not in the cache are encoded.
+                query_vec = embed_chunks(self.chunks, self.log_lines).mean(axis=0)
+            else:
+                model = get_model()
+                query_vec = model.encode(" ".join(log_lines[:10]))
             results = client.search(
                 collection_name=COLLECTION_NAME,
                 query_vector=query_vec,
@@ -0,0 +1,28 @@
+# redaction.py
+
+import re
+
+# IP, user and Windows-path detectors combined into one alternation so the text
+# is scanned once. The user branch skips values that are IPs, which the IP
+# detector claims first, matching the old pass order.
+REDACTION_PATTERN = re.compile(
+    r'(?P<ip>\b(?:\d{1,3}\.){3}\d{1,3}\b)'
+    r'|(?P<user>(?i:user) "?(?!(?:\d{1,3}\.){3}\d{1,3}\b)[\w\-]+"?)'
+    r'|(?P<path>[a-zA-Z]:\\(?:[^\\\n]+\\)*[^\\\n]+)'
+)
+REDACTION_TOKENS = {"ip": "[IP_REDACTED]", "user": "[USER]", "path": "[FILE_PATH]"}
+
+
+class Redactor:
+    # Single-pass Safe Mode engine; keeps per-detector redaction counts
+
+    def __init__(self):
+        self.counts = {kind: 0 for kind in REDACTION_TOKENS}
+
+    def _replace(self, match: re.Match) -> str:
+        kind = match.lastgroup
+        self.counts[kind] += 1
+        return REDACTION_TOKENS[kind]
+
+    def redact(self, text: str) -> str:
+        return REDACTION_PATTERN.sub(self._replace, text)
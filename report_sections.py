@@ -0,0 +1,61 @@
+# report_sections.py
+
+import re
+
+# A section title alone on its line: "ROOT CAUSE" or "2. ROOT CAUSE"
+SECTION_HEADER_RE = re.compile(r"^(?:\d+\.\s*)?([A-Z \-]+)$")
+# A timeline step: "- 2025-06-01T12:05:12Z: description" (a space for the T is accepted)
+TIMELINE_STEP_RE = re.compile(r"-\s*(\d{4}-\d{2}-\d{2}[T ][\d:\.]+Z?|[\d\-T:\.Z]+):\s*(.+)")
+
+
+def parse_report(report: str) -> dict[str, str]:
+    # Section title -> body of the 8-section report
+    sections = {}
+    parser = SectionStream()
+    for title, body in parser.feed(report.strip()) + parser.close():
+        sections[title] = body
+    return sections
+
+
+def timeline_step(line: str) -> tuple[str, str] | None:
+    # (timestamp, description) of a STEP-BY-STEP TIMELINE line, None otherwise
+    m = TIMELINE_STEP_RE.match(line)
+    return m.groups() if m else None
+
+
+class SectionStream:
+    # Splits a report into sections while it is still being written: feed()
+    # takes text as it arrives and returns the sections completed by it. A
+    # section is complete once the next title starts; close() returns the last.
+
+    def __init__(self):
+        self._partial = ""  # text after the last newline
+        self._title: str | None = None
+        self._lines: list[str] = []
+
+    def feed(self, text: str) -> list[tuple[str, str]]:
+        *lines, self._partial = (self._partial + text).split("\n")
+        return [section for section in map(self._add_line, lines) if section]
+
+    def close(self) -> list[tuple[str, str]]:
+        done = [self._add_line(self._partial)] if self._partial else []
+        self._partial = ""
+        done.append(self._finish())
+        self._title, self._lines = None, []
+        return [section for section in done if section]
+
+    def _add_line(self, line: str) -> tuple[str, str] | None:
+        line = line.strip()
+        match = SECTION_HEADER_RE.match(line)
+        if match:
+            finished = self._finish()
+            self._title, self._lines = match.group(1).strip(), []
+            return finished
+        if self._title is not None:
+            self._lines.append(line)
+        return None
+
+    def _finish(self) -> tuple[str, str] | None:
+        if self._title is None:
+            return None
+        return self._title, "\n".join(self._lines).strip()
@@ -0,0 +1,53 @@
+from llm_cache import ChunkCache, ClassificationCache, ResponseCache, request_key
+
+
+def test_request_key_ignores_key_order_but_not_content():
+    payload = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.1}
+    reordered = {"temperature": 0.1, "messages": [{"content": "hi", "role": "user"}], "model": "m"}
+    assert request_key(payload) == request_key(reordered)
+    assert request_key(payload) != request_key({**payload, "temperature": 0.2})
+
+
+def test_responses_survive_a_restart(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(path).put("k", b'{"ok": true}', "m")
+    reopened = ResponseCache(path)
+    assert reopened.get("k") == b'{"ok": true}'
+    assert reopened.get("other") is None
+    assert reopened.stats()["hits"] == 1 and reopened.stats()["misses"] == 1
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr("llm_cache.time.time", lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"2")
+    cache.get("a")
+    cache.put("c", b"3")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1" and cache.get("c") == b"3"
+
+
+def test_expired_responses_are_not_served(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: now[0])
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), ttl=60)
+    cache.put("k", b"x")
+    now[0] += 61
+    assert cache.get("k") is None
+
+
+def test_template_cache_keeps_only_incident_independent_fields(tmp_path):
+    cache = ClassificationCache(str(tmp_path / "templates.sqlite"))
+    cache.put_many({"Failed password for <*>": {"risk_score": 80, "risk_level": "High", "confidence": 90,
+                                                "justification": "host web01 under attack"}})
+    found = cache.get_many(["Failed password for <*>", "unseen <*>"])
+    assert found == {"Failed password for <*>": {"risk_score": 80, "risk_level": "High", "confidence": 90}}
+
+
+def test_chunk_cache_round_trips_items(tmp_path):
+    cache = ChunkCache(str(tmp_path / "chunks.sqlite"))
+    items = [{"log": "a", "risk_score": 10}]
+    cache.put_many({"c1": items})
+    assert cache.get_many(["c1", "c2"]) == {"c1": items}
@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+requests = pytest.importorskip("requests")
+
+import llm_client
+
+
+def _response(status, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response._content = json.dumps(body or {}).encode("utf-8")
+    response._content_consumed = True
+    response.headers.update(headers or {})
+    return response
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.posts = 0
+
+    def post(self, *args, **kwargs):
+        self.posts += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+@pytest.fixture
+def session(monkeypatch):
+    sleeps = []
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(llm_client.time, "sleep", sleeps.append)
+
+    def install(*responses):
+        fake = FakeSession(responses)
+        monkeypatch.setattr(llm_client, "get_session", lambda: fake)
+        return fake, sleeps
+    return install
+
+
+def test_retry_after_is_waited_out_in_full(session):
+    ok = {"choices": [{"message": {"content": "done"}}]}
+    fake, sleeps = session(_response(429, headers={"Retry-After": "45"}), _response(200, ok))
+    records = []
+    response = llm_client.chat_completion({"model": "m"}, use_cache=False, on_record=records.append)
+    assert response.status_code == 200
+    assert sleeps == [45.0]
+    assert fake.posts == 2
+    assert records[0].attempts == 2 and records[0].status == 200
+
+
+def test_retry_after_beyond_the_ceiling_ends_the_retries(session):
+    fake, sleeps = session(_response(429, headers={"Retry-After": "3600"}), _response(200))
+    response = llm_client.chat_completion({"model": "m"}, use_cache=False)
+    assert response.status_code == 429
+    assert sleeps == []
+    assert fake.posts == 1
+
+
+def test_server_errors_back_off_and_return_the_last_response(session):
+    fake, sleeps = session(*[_response(503) for _ in range(3)])
+    response = llm_client.chat_completion({"model": "m"}, use_cache=False, max_retries=2)
+    assert response.status_code == 503
+    assert fake.posts == 3
+    assert len(sleeps) == 2 and all(0 <= s <= llm_client.BACKOFF_MAX for s in sleeps)
+
+
+def test_network_failure_is_reported(session):
+    fake, sleeps = session(*[requests.ConnectionError("reset") for _ in range(3)])
+    records = []
+    with pytest.raises(requests.ConnectionError):
+        llm_client.chat_completion({"model": "m"}, use_cache=False, max_retries=2, on_record=records.append)
+    assert fake.posts == 3
+    assert len(records) == 1
+    assert records[0].status is None and records[0].attempts == 3
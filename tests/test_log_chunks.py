@@ -0,0 +1,58 @@
+import random
+
+from log_chunks import CHUNK_MAX_EVENTS, CHUNK_MIN_EVENTS, chunk_lines, chunk_overlap, corpus_id
+
+
+def _lines(n=6000, seed=3):
+    rng = random.Random(seed)
+    return [f"[app.log] 2024-01-01T10:00:{i % 60:02d}Z request {rng.getrandbits(32):08x} from 10.0.{i % 7}.{i % 250}"
+            for i in range(n)]
+
+
+def _ids(chunks):
+    return [c.id for c in chunks]
+
+
+def test_chunks_cover_the_lines_within_the_size_bounds():
+    lines = _lines()
+    chunks = chunk_lines(lines)
+    assert chunks[0].start == 0 and chunks[-1].end == len(lines)
+    assert all(a.end == b.start for a, b in zip(chunks, chunks[1:]))
+    for chunk in chunks[:-1]:
+        assert CHUNK_MIN_EVENTS <= chunk.end - chunk.start <= CHUNK_MAX_EVENTS
+
+
+def test_max_size_forces_a_boundary():
+    chunks = chunk_lines(["same line"] * 3000, min_events=8, max_events=100)
+    assert all(c.end - c.start <= 100 for c in chunks)
+    assert len({c.id for c in chunks[:-1]}) == 1
+
+
+def test_boundaries_resync_after_an_insert():
+    lines = _lines()
+    before = chunk_lines(lines)
+    after = chunk_lines(lines[:1000] + ["[app.log] injected line"] + lines[1000:])
+    # Only the chunks around the insert change
+    assert len(set(_ids(before)) - set(_ids(after))) <= 2
+    assert _ids(before)[-5:] == _ids(after)[-5:]
+
+
+def test_appended_tail_keeps_the_earlier_chunks():
+    lines = _lines()
+    before = chunk_lines(lines)
+    after = chunk_lines(lines + _lines(500, seed=9))
+    assert _ids(after)[:len(before) - 1] == _ids(before)[:-1]
+
+
+def test_corpus_id_is_stable_and_content_defined():
+    lines = _lines()
+    assert corpus_id(chunk_lines(lines)) == corpus_id(chunk_lines(list(lines)))
+    assert corpus_id(chunk_lines(lines)) != corpus_id(chunk_lines(lines[:-1]))
+    assert corpus_id(chunk_lines(lines)).startswith("log_")
+
+
+def test_overlap_needs_more_than_a_shared_header():
+    header = ["h1"]
+    assert chunk_overlap(header + ["a", "b", "c"], header + ["x", "y", "z"]) == 0.25
+    assert chunk_overlap(["a", "b", "c", "d"], ["a", "b", "c", "e", "f"]) == 0.6
+    assert chunk_overlap([], ["a"]) == 0.0
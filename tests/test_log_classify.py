@@ -0,0 +1,86 @@
+import json
+import re
+
+import log_classify
+
+
+class FakeResponse:
+    def __init__(self, items=None, status=200):
+        self.status_code = status
+        self.content = json.dumps(items) if items is not None else "no JSON here"
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+
+def _item(log, score):
+    return {"log": log, "risk_score": score, "risk_level": "Low", "justification": "x", "confidence": 50}
+
+
+def _classify(monkeypatch, originals, answer):
+    monkeypatch.setattr(log_classify, "chat_completion", lambda payload, **kwargs: FakeResponse(answer))
+    return log_classify._classify_batch("Logs:\n", originals, None, max_tokens=1000)
+
+
+def test_reordered_answers_are_matched_by_echo(monkeypatch):
+    lines = ["login ok", "disk full", "port scan"]
+    result = _classify(monkeypatch, lines, [_item("port scan", 90), _item("login ok", 5), _item("disk full", 40)])
+    assert [(r["log"], r["risk_score"]) for r in result] == [("login ok", 5), ("disk full", 40), ("port scan", 90)]
+
+
+def test_missing_answer_leaves_only_that_log_out(monkeypatch):
+    lines = ["login ok", "disk full", "port scan"]
+    result = _classify(monkeypatch, lines, [_item("login ok", 5), _item("port scan", 90)])
+    assert [(r["log"], r["risk_score"]) for r in result] == [("login ok", 5), ("port scan", 90)]
+
+
+def test_duplicate_lines_take_one_answer_each(monkeypatch):
+    lines = ["login ok", "port scan", "login ok"]
+    result = _classify(monkeypatch, lines, [_item("login ok", 5), _item("login ok", 7), _item("port scan", 90)])
+    assert [(r["log"], r["risk_score"]) for r in result] == [("login ok", 5), ("port scan", 90), ("login ok", 7)]
+
+
+def test_rewritten_echoes_fall_back_to_order(monkeypatch):
+    lines = ["login ok", "disk full"]
+    result = _classify(monkeypatch, lines, [_item("Login OK", 5), _item("Disk full.", 40)])
+    assert [(r["log"], r["risk_score"]) for r in result] == [("login ok", 5), ("disk full", 40)]
+
+
+def test_unplaceable_leftovers_are_dropped(monkeypatch):
+    lines = ["login ok", "disk full"]
+    result = _classify(monkeypatch, lines, [_item("login ok", 5), _item("something", 1), _item("else", 2)])
+    assert [(r["log"], r["risk_score"]) for r in result] == [("login ok", 5)]
+
+
+def test_failed_batch_is_retried_past_the_cache(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(log_classify, "PROMPT_COMPRESSION", False)
+    calls = []
+
+    def chat_completion(payload, use_cache=True, **kwargs):
+        calls.append(use_cache)
+        if len(calls) == 1:
+            return FakeResponse()  # unparseable: the batch fails
+        prompt = payload["messages"][0]["content"]
+        logs = re.findall(r"^\d+\. (.*)$", prompt, re.MULTILINE)
+        return FakeResponse([_item(log, 50) for log in logs])
+
+    monkeypatch.setattr(log_classify, "chat_completion", chat_completion)
+    lines = ["2024-01-01T10:00:00Z login ok", "2024-01-01T10:00:01Z disk full"]
+    result = log_classify.classify_logs_with_llm(lines, values=[0.0, 0.0])
+    assert calls == [True, False]
+    assert [r["log"] for r in result] == lines
+
+
+def test_batches_give_up_after_the_retries(monkeypatch):
+    monkeypatch.setenv("GROQ_API_KEY", "test-key")
+    monkeypatch.setattr(log_classify, "PROMPT_COMPRESSION", False)
+    calls = []
+    monkeypatch.setattr(log_classify, "chat_completion",
+                        lambda payload, **kwargs: calls.append(1) or FakeResponse(status=500))
+    assert log_classify.classify_logs_with_llm(["login ok"], values=[0.0]) == []
+    assert len(calls) == log_classify.CLASSIFY_BATCH_RETRIES + 1
@@ -0,0 +1,45 @@
+from log_clusters import cluster_near_duplicates, estimated_jaccard, expand_cluster_results, minhash, polarity
+
+
+def test_failed_and_accepted_logins_stay_apart():
+    failed = "Failed password for <*> from <*> port <*> ssh2"
+    accepted = "Accepted password for <*> from <*> port <*> ssh2"
+    # Similar enough by word bigrams to pass the Jaccard check on its own
+    assert estimated_jaccard(minhash(failed), minhash(accepted)) >= 0.6
+    assert polarity(failed) != polarity(accepted)
+    assert cluster_near_duplicates([failed, accepted]) == [[0], [1]]
+
+
+def test_templates_differing_in_parameters_merge():
+    texts = [
+        "session opened for user <*> by <*>",
+        "session opened for user root by <*>",
+        "Failed password for <*> from <*> port <*> ssh2",
+    ]
+    assert cluster_near_duplicates(texts) == [[0, 1], [2]]
+
+
+def test_reworded_messages_merge():
+    texts = [
+        "Unable to connect to database server <*>: connection refused",
+        "Unable to connect to the database server <*>: connection refused",
+        "Unable to connect to database server <*> (connection refused)",
+        "Could not connect to database server <*>: connection refused",
+        "Disk quota exceeded for <*>",
+    ]
+    assert cluster_near_duplicates(texts) == [[0, 1, 2, 3], [4]]
+
+
+def test_negated_messages_stay_apart():
+    texts = [
+        "backup of volume <*> completed",
+        "backup of volume <*> not completed",
+    ]
+    assert cluster_near_duplicates(texts, threshold=0.3) == [[0], [1]]
+
+
+def test_unmatched_results_are_not_assigned_by_position():
+    texts = ["Failed password for <*>", "Accepted password for <*>"]
+    clusters = [[0], [1]]
+    classified = [{"log": "a rewritten echo", "risk_score": 90}, {"log": texts[1], "risk_score": 10}]
+    assert expand_cluster_results(clusters, texts, classified) == [{"log": texts[1], "risk_score": 10}]
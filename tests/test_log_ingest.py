@@ -0,0 +1,29 @@
+from log_ingest import assemble_records, compact_event, parse_json_event
+
+
+def test_only_trace_lines_continue_a_record():
+    lines = [
+        "[app.log] 2024-01-01 10:00:00 ERROR request failed",
+        "[app.log] java.lang.IllegalStateException: closed",
+        "[app.log]     at com.example.Pool.get(Pool.java:42)",
+        "[app.log] Caused by: java.io.IOException: reset",
+        "[app.log] worker 3 restarted",
+        "[app.log] health check ok",
+    ]
+    records = list(assemble_records(lines))
+    assert len(records) == 3
+    assert records[0].count(" | ") == 3
+    assert records[1:] == lines[4:]
+
+
+def test_record_length_is_capped():
+    lines = ["[app.log] 2024-01-01 10:00:00 dump"] + ["[app.log]   frame"] * 10
+    records = list(assemble_records(lines, max_lines=4))
+    assert [r.count(" | ") + 1 for r in records] == [4, 4, 3]
+
+
+def test_compact_event_is_one_line():
+    record = {"timestamp": "2024-01-01T10:00:00Z", "msg": "a\u2028b\x85c\u2029d\né"}
+    event = compact_event(record)
+    assert len(event.splitlines()) == 1
+    assert parse_json_event(event) == record
@@ -0,0 +1,50 @@
+import random
+
+import log_sort
+from log_sort import external_sort, external_sort_keyed, merge_sources, sort_log_lines
+
+
+def _shuffled_lines(n=300):
+    lines = [f"2024-03-01T{i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z event {i}" for i in range(n)]
+    shuffled = lines[:]
+    random.Random(3).shuffle(shuffled)
+    return lines, shuffled
+
+
+def test_external_sort_spills_and_orders():
+    ordered, shuffled = _shuffled_lines()
+    # A ceiling of a few lines forces dozens of spill files
+    assert list(external_sort(iter(shuffled), memory_limit=1000)) == ordered
+
+
+def test_large_inputs_take_the_external_sort():
+    ordered, shuffled = _shuffled_lines()
+    continuation = "    at Worker.run(Worker.java:42)"
+    shuffled.insert(shuffled.index(ordered[10]) + 1, continuation)
+    result = list(sort_log_lines(shuffled, memory_limit=1000))
+    assert result == ordered[:11] + [continuation] + ordered[11:]
+
+
+def test_sources_are_merged_by_timestamp():
+    auth = ["[auth.log] 2024-03-01T10:00:00Z login", "[auth.log] 2024-03-01T10:00:05Z sudo"]
+    # Another clock format, and a trace line that must stay under its event
+    app = ["[app.log] 2024-03-01 10:00:02 error", "[app.log]     at Worker.run(Worker.java:42)",
+           "[app.log] 2024-03-01 10:00:09 retry"]
+    merged = list(sort_log_lines(auth + app))
+    assert merged == [auth[0], app[0], app[1], auth[1], app[2]]
+
+
+def test_merge_sources_sorts_only_disordered_sources():
+    late_first = ["2024-03-01T10:00:03Z b", "2024-03-01T10:00:01Z a"]
+    in_order = ["[x.log] 2024-03-01T10:00:02Z c"]
+    assert list(merge_sources([late_first, in_order])) == [late_first[1], in_order[0], late_first[0]]
+
+
+def test_run_size_counts_every_text_field(monkeypatch):
+    spills = []
+    write_spill = log_sort._write_spill
+    monkeypatch.setattr(log_sort, "_write_spill", lambda run, tmp_dir: spills.append(len(run)) or write_spill(run, tmp_dir))
+    records = [(20 - i, "x", "payload " * 125) for i in range(20)]
+    # The lines alone would fit in one run; the payloads do not
+    assert [r[0] for r in external_sort_keyed(records, memory_limit=10000)] == list(range(1, 21))
+    assert spills and max(spills) < 20
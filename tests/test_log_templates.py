@@ -0,0 +1,20 @@
+from log_templates import event_template, mine_templates
+
+
+def test_event_template_masks_users_and_hosts():
+    first = event_template("[auth.log] Mar  1 10:00:00 web01 sshd[42]: Failed password for user0 from 10.0.0.1 port 22 ssh2")
+    second = event_template("[secure.log] Jun  9 23:59:59 db sshd[7]: Failed password for alice0 from 10.0.0.9 port 2222 ssh2")
+    assert first == second
+    assert event_template("2024-01-01T00:00:00Z session opened for user root by (uid=0)") == \
+        event_template("2024-02-01T00:00:00Z session opened for user bob by (uid=1000)")
+
+
+def test_event_template_keeps_event_words():
+    assert event_template("2024-01-01T00:00:00Z Failed password for root from 10.0.0.1 port 22 ssh2") != \
+        event_template("2024-01-01T00:00:00Z Accepted password for root from 10.0.0.1 port 22 ssh2")
+
+
+def test_repeated_events_share_a_template():
+    miner = mine_templates([f"2024-01-01T00:00:0{i}Z Connection closed by 10.0.0.{i} port 22" for i in range(5)])
+    assert len(miner.templates) == 1
+    assert miner.templates[0].count == 5
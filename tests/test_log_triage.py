@@ -0,0 +1,34 @@
+from log_triage import triage
+
+
+def _steady(minutes=20, per_minute=5):
+    # The same heartbeat at the same rate from one source
+    return [f"[app.log] 2024-01-01T10:{m:02d}:{s * 10:02d}Z INFO heartbeat ok"
+            for m in range(minutes) for s in range(per_minute)]
+
+
+def test_steady_stream_scores_near_zero():
+    result = triage(_steady())
+    assert max(result.scores) < 1.0
+    assert not any(w.reasons for w in result.windows)
+
+
+def test_injected_burst_gets_the_top_window():
+    lines = _steady()
+    burst = [f"[app.log] 2024-01-01T10:12:{s:02d}Z ERROR Failed password for root from 203.0.113.{s}"
+             for s in range(40)]
+    lines[60:60] = burst
+    result = triage(lines)
+    top = result.windows[0]
+    assert top.start.minute == 12
+    assert top.first_line <= 60 and top.last_line >= 99
+    assert "errors/denies" in top.reasons
+    assert max(result.scores) == result.scores[60]
+
+
+def test_rare_event_outscores_the_routine_ones():
+    lines = _steady()
+    lines.insert(50, "[app.log] 2024-01-01T10:10:05Z CRITICAL kernel panic on host db-7")
+    result = triage(lines)
+    assert result.windows[0].start.minute == 10
+    assert result.scores.index(max(result.scores)) == 50
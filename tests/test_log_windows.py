@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import pytest
+
+import token_budget
+from log_windows import split_time_windows
+
+
+@pytest.fixture(autouse=True)
+def no_tokenizer(monkeypatch):
+    monkeypatch.setattr(token_budget, "_tokenizer", lambda: None)
+
+
+def test_windows_follow_clock_boundaries():
+    lines = [
+        "2024-03-01T09:59:00Z login",
+        "    at Worker.run(Worker.java:42)",
+        "2024-03-01T10:01:00Z sudo",
+        "2024-03-01T10:59:59Z logout",
+        "2024-03-01T12:30:00Z reboot",
+    ]
+    windows = split_time_windows(lines, token_budget=10_000, minutes=60)
+    assert [w.lines for w in windows] == [lines[:2], lines[2:4], lines[4:]]
+    assert windows[1].start == datetime(2024, 3, 1, 10, 1)
+    assert windows[1].end == datetime(2024, 3, 1, 10, 59, 59)
+
+
+def test_windows_split_to_fit_the_token_budget():
+    lines = [f"2024-03-01T10:{i:02d}:00Z request {i} from 10.0.0.{i} denied" for i in range(40)]
+    budget = 200
+    windows = split_time_windows(lines, token_budget=budget, minutes=60)
+    assert len(windows) > 1
+    assert [line for w in windows for line in w.lines] == lines
+    for window in windows:
+        assert sum(n + 1 for n in token_budget.count_tokens_lines(window.lines)) <= budget
+
+
+def test_appending_logs_leaves_earlier_windows_unchanged():
+    first = ["2024-03-01T09:10:00Z a", "2024-03-01T10:20:00Z b"]
+    extended = first + ["2024-03-01T10:40:00Z c", "2024-03-01T11:05:00Z d"]
+    before = split_time_windows(first, token_budget=10_000)
+    after = split_time_windows(extended, token_budget=10_000)
+    assert after[0] == before[0]
+    assert after[1].lines[:1] == before[1].lines
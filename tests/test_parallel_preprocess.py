@@ -0,0 +1,46 @@
+import random
+
+from log_sort import sort_log_lines
+from parallel_preprocess import preprocess_parallel
+from timestamps import match_format
+
+
+def _corpus():
+    # Two sources, each mostly in order, with continuation lines and a
+    # untimestamped head line
+    rng = random.Random(7)
+    lines = ["[app.log] starting up"]
+    for i in range(400):
+        source = "auth.log" if i % 2 else "app.log"
+        second = i * 3 + rng.randint(0, 2)
+        lines.append(f"[{source}] 2024-01-01T10:{second // 60:02d}:{second % 60:02d}Z event {i} from 10.0.0.{i % 250}")
+        if i % 50 == 0:
+            lines.append(f"[{source}]     at Worker.run(Worker.java:{i})")
+    rng.shuffle(lines[200:260])
+    return lines
+
+
+def test_matches_the_serial_sort():
+    lines = _corpus()
+    expected = list(sort_log_lines(list(lines)))
+    result = preprocess_parallel(lines, safe_mode=False, workers=1, chunk_lines=64)
+    assert list(result.lines) == expected
+    assert len(result.formats) == len(expected)
+    assert result.formats.itemsize == 1
+    assert match_format(result.lines[1], result.formats[1]).timestamp in result.lines[1]
+
+
+def test_spilled_merge_gives_the_same_order():
+    lines = _corpus()
+    in_memory = preprocess_parallel(lines, safe_mode=False, workers=1, chunk_lines=64)
+    spilled = preprocess_parallel(lines, safe_mode=False, workers=1, chunk_lines=64, memory_limit=2000)
+    assert list(spilled.lines) == list(in_memory.lines)
+    assert spilled.formats == in_memory.formats
+
+
+def test_process_pool_redacts_and_counts():
+    lines = _corpus()
+    result = preprocess_parallel(lines, safe_mode=True, workers=2, min_lines=0, chunk_lines=64)
+    assert result.redactions["ip"] == 400
+    assert not any("10.0.0." in line for line in result.lines)
+    assert len(result.lines) == len(lines)
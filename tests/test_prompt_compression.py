@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from prompt_compression import PromptCompressor
+from report_sections import timeline_step
+from timestamps import to_datetime
+
+
+def test_offsets_round_trip_through_the_timeline_parser():
+    compressor = PromptCompressor()
+    compressed = compressor.compress_lines([
+        '[app.json] {"ts":"2025-06-01T12:00:00Z","msg":"login ok"}',
+        '[app.json] {"ts":"2025-06-01T12:05:12Z","msg":"root shell"}',
+    ])
+    assert "T+312" in compressed[1]
+    assert "[f1]" in compressed[0]
+
+    restored = compressor.restore("- T+312: root shell opened from [f1]")
+    step = timeline_step(restored)
+    assert step is not None
+    ts, desc = step
+    assert to_datetime(ts, "iso8601") == datetime(2025, 6, 1, 12, 5, 12)
+    assert desc == "root shell opened from [app.json]"
+
+
+def test_verbatim_echo_restores_the_original_line():
+    compressor = PromptCompressor()
+    line = "[auth.log] 2025-06-01T12:00:00Z sshd: [IP_REDACTED]  [IP_REDACTED] failed"
+    short = compressor.compress_lines([line])[0]
+    assert "[IP_REDACTED]x2" in short
+    assert compressor.restore_line(short) == line
+
+
+def test_timeline_step_accepts_a_space_separator():
+    assert timeline_step("- 2025-06-01 12:05:12: login") == ("2025-06-01 12:05:12", "login")
+    assert timeline_step("no step here") is None
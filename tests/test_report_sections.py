@@ -0,0 +1,37 @@
+from report_sections import SectionStream, parse_report
+
+REPORT = """1. STEP-BY-STEP TIMELINE
+- 2025-06-01T12:00:00Z: login
+- 2025-06-01T12:05:12Z: root shell
+2. ROOT CAUSE
+Weak password on the admin account.
+3. REMEDIATION STEPS
+Rotate credentials."""
+
+
+def test_sections_complete_as_the_next_title_arrives():
+    stream = SectionStream()
+    done = []
+    # Small pieces that split titles and lines mid-word
+    for i in range(0, len(REPORT), 7):
+        done.append(list(stream.feed(REPORT[i:i + 7])))
+    completed = [section for batch in done for section in batch]
+    assert [title for title, _ in completed] == ["STEP-BY-STEP TIMELINE", "ROOT CAUSE"]
+    assert stream.close() == [("REMEDIATION STEPS", "Rotate credentials.")]
+
+
+def test_a_section_is_emitted_once_the_following_title_is_whole():
+    stream = SectionStream()
+    assert stream.feed("ROOT CAUSE\nWeak password.\nREMEDIATION") == []
+    assert stream.feed(" STEPS\n") == [("ROOT CAUSE", "Weak password.")]
+
+
+def test_streamed_and_whole_parsing_agree():
+    stream = SectionStream()
+    streamed = {}
+    for piece in REPORT.split(" "):
+        streamed.update(stream.feed(piece + " "))
+    streamed.update(stream.close())
+    whole = parse_report(REPORT)
+    assert streamed.keys() == whole.keys()
+    assert streamed["ROOT CAUSE"] == whole["ROOT CAUSE"]
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from timestamps import TimestampRecognizer, format_code, label_line, match_format, split_label, syslog_years, to_datetime
+
+
+def test_only_upload_names_are_labels():
+    assert split_label("[auth.log] Accepted password") == ("auth.log", "Accepted password")
+    assert split_label("[ERROR] disk full") == (None, "[ERROR] disk full")
+    assert split_label("[org.example.Worker] started") == (None, "[org.example.Worker] started")
+
+
+def test_bracketed_timestamp_is_not_a_label():
+    match = TimestampRecognizer().match("[2024-01-01T10:00:00Z] service started")
+    assert match.source is None
+    assert match.timestamp == "2024-01-01T10:00:00Z"
+    assert match.message == "service started"
+
+
+def test_written_labels_read_back():
+    assert split_label(label_line("messages", "x")) == ("messages.log", "x")
+
+
+def test_syslog_year_comes_from_the_file():
+    recognizer = TimestampRecognizer()
+    matches = [recognizer.match(line) for line in (
+        "[auth.log] Feb 29 10:00:00 host sshd: x",
+        "[auth.log] 2024-03-01T00:00:00Z host y",
+        "[kern.log] Mar  1 10:00:00 host kernel: z",
+    )]
+    years = syslog_years(matches)
+    assert years == {"auth.log": 2024, "kern.log": datetime.now().year}
+    assert to_datetime("Feb 29 10:00:00", "syslog", years["auth.log"]) == datetime(2024, 2, 29, 10)
+
+
+def test_format_codes_give_back_the_match():
+    recognizer = TimestampRecognizer()
+    for line in ("[auth.log] Feb 29 10:00:00 host sshd: x",
+                 "[app.log] 2024-03-01T00:00:00Z started",
+                 "[2024-01-01 10:00:00] service started",
+                 "no timestamp here"):
+        match = recognizer.match(line)
+        assert match_format(line, format_code(match)) == match
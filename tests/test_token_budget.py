@@ -0,0 +1,43 @@
+import re
+
+import pytest
+
+import token_budget
+from token_budget import PromptTooLarge, check_request, count_tokens, pack_lines
+
+# Llama 3 pre-tokenizer pieces, ASCII only: every piece is at least one token
+_PIECES_RE = re.compile(r"'(?:s|t|re|ve|m|ll|d)|[^\r\n A-Za-z0-9]?[A-Za-z]+|\d{1,3}| ?[^\sA-Za-z0-9]+[\r\n]*|\s+")
+
+
+@pytest.fixture(autouse=True)
+def no_tokenizer(monkeypatch):
+    # Counts fall back to the length estimate, as while the tokenizer loads
+    monkeypatch.setattr(token_budget, "_tokenizer", lambda: None)
+
+
+@pytest.mark.parametrize("text", [
+    "2025-06-01T12:05:12.123456Z",
+    "192.168.100.254:51234 -> 10.0.0.1:443",
+    "[auth.log] Jun  1 12:05:12 web01 sshd[31337]: Failed password for root from 203.0.113.7 port 52611 ssh2",
+    "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+])
+def test_estimate_never_undercounts_log_text(text):
+    assert count_tokens(text) >= len(_PIECES_RE.findall(text))
+    # Numbers dominate these lines: well under the old three characters per token
+    assert count_tokens(text) > len(text) / 3
+
+
+def test_estimated_requests_are_refused_locally(monkeypatch):
+    monkeypatch.setattr(token_budget, "CONTEXT_OVERRIDE", 1000)
+    line = "2025-06-01T12:05:12Z 10.0.0.1 -> 10.0.0.2:443 denied\n"
+    with pytest.raises(PromptTooLarge):
+        # 1300 characters: about 433 tokens at three characters each
+        check_request([{"role": "user", "content": line * 25}], max_output=500)
+
+
+def test_packed_lines_stay_within_budget():
+    lines = [f"2025-06-01T12:{i:02d}:00Z request {i} from 10.0.{i}.1 failed" for i in range(60)]
+    kept, used = pack_lines(lines, budget=300)
+    assert used <= 300
+    assert sum(count_tokens(line) + 1 for line in kept) == used
+    assert kept == sorted(kept, key=lines.index)
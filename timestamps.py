@@ -0,0 +1,234 @@
+# timestamps.py
+
+import re
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, NamedTuple
+
+# Lines per source used to vote on that source's timestamp format
+SAMPLE_SIZE = 50
+
+# Every timestamp layout we recognise, matched after any "[source] " label.
+# Group 1 is the timestamp, group 2 (possibly empty) the message.
+TIMESTAMP_FORMATS = {
+    "iso8601": re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[\+\-]\d{2}:\d{2})?)\s*[:,\-]?\s*(.*)"),
+    "datetime": re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?::?$|:?\s+(.*))"),
+    "bracketed": re.compile(
+        r"\[(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[\+\-]\d{2}:?\d{2})?)\](?:$|\s+(.*))"),
+    "syslog": re.compile(r"([A-Z][a-z]{2} +\d{1,2} \d{2}:\d{2}:\d{2})(?:$|\s+(.*))"),
+    "epoch": re.compile(r"(\d{10})(?:$|\s+(.*))"),
+}
+
+# pandas formats for vectorized parsing of each pinned format
+_PANDAS_FORMATS = {
+    "iso8601": "ISO8601",
+    "datetime": "%Y-%m-%d %H:%M:%S",
+    "bracketed": "ISO8601",
+    "syslog": "%Y %b %d %H:%M:%S",  # year prepended, see syslog_years
+}
+
+# Source labels are upload file names, so only "[name.ext] " with a log file
+# extension (optionally rotated: "auth.log.1") counts; "[ERROR] " or a bracketed
+# timestamp stays part of the line. Exactly one separator; indentation after it
+# is content.
+LABEL_EXTENSIONS = ("log", "txt", "json", "jsonl", "ndjson", "csv", "out", "err")
+_LABEL_NAME = rf"[^\[\]\s][^\[\]]*\.(?:{'|'.join(LABEL_EXTENSIONS)})(?:[.\-]\d+)?"
+_LABEL_RE = re.compile(rf"\[({_LABEL_NAME})\]\s", re.IGNORECASE)
+_LABEL_NAME_RE = re.compile(_LABEL_NAME, re.IGNORECASE)
+_ISO_PARTS_RE = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d+))?(Z|[+-]\d{2}:?\d{2})?$")
+_MONTHS = {m: i for i, m in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1)}
+
+
+class TimestampMatch(NamedTuple):
+    source: str | None
+    timestamp: str
+    message: str
+    format: str
+
+
+# --- Labels ---
+def source_label(name: str) -> str:
+    # Label for an upload source that split_label will read back: brackets are
+    # replaced and names without a log file extension get ".log"
+    label = re.sub(r"[\[\]]", "_", name.strip()) or "upload"
+    return label if _LABEL_NAME_RE.fullmatch(label) else f"{label}.log"
+
+
+def split_label(line: str) -> tuple[str | None, str]:
+    # "[file.log] ..." labels added at upload by label_line
+    m = _LABEL_RE.match(line)
+    if m:
+        return m.group(1), line[m.end():]
+    return None, line
+
+
+def label_line(label: str, line: str) -> str:
+    return f"[{source_label(label)}] {line}"
+
+
+# --- Timestamp string -> datetime ---
+def to_datetime(timestamp: str, fmt: str, year: int | None = None) -> datetime | None:
+    # Naive UTC datetime for a recognised timestamp string. Syslog timestamps
+    # have no year and get the given one, by default the current year.
+    try:
+        if fmt in ("iso8601", "datetime", "bracketed"):
+            m = _ISO_PARTS_RE.match(timestamp)
+            if not m:
+                return None
+            y, mo, d, h, mi, s, frac, tz = m.groups()
+            frac = (frac or "0")[:6].ljust(6, "0")
+            ts = datetime(int(y), int(mo), int(d), int(h), int(mi), int(s), int(frac))
+            if tz and tz != "Z":
+                sign = -1 if tz[0] == "-" else 1
+                digits = tz[1:].replace(":", "")
+                ts -= sign * timedelta(hours=int(digits[:2]), minutes=int(digits[2:]))
+            return ts
+        if fmt == "syslog":
+            mon, day, clock = timestamp.split()
+            month = _MONTHS.get(mon)
+            if not month:
+                return None
+            h, mi, s = clock.split(":")
+            return datetime(year or datetime.now().year, month, int(day), int(h), int(mi), int(s))
+        if fmt == "epoch":
+            return datetime.fromtimestamp(int(timestamp), tz=timezone.utc).replace(tzinfo=None)
+    except ValueError:
+        return None
+    return None
+
+
+# --- Recognizer ---
+class TimestampRecognizer:
+    # Votes on each source's format over its first sample_size timestamped lines,
+    # then pins it: later lines try the pinned pattern first and only fall back
+    # to the full set when it misses.
+
+    def __init__(self, sample_size: int = SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._pinned: dict[str | None, str] = {}
+        self._votes: dict[str | None, Counter] = {}
+
+    def pinned_format(self, source: str | None) -> str | None:
+        return self._pinned.get(source)
+
+    def _match_any(self, text: str) -> tuple[str, re.Match] | None:
+        for name, pattern in TIMESTAMP_FORMATS.items():
+            m = pattern.match(text)
+            if m:
+                return name, m
+        return None
+
+    def match(self, line: str) -> TimestampMatch | None:
+        source, text = split_label(line.strip())
+        text = text.lstrip()
+
+        found = None
+        pinned = self._pinned.get(source)
+        if pinned:
+            m = TIMESTAMP_FORMATS[pinned].match(text)
+            if m:
+                found = pinned, m
+        if found is None:
+            found = self._match_any(text)
+            if found is None:
+                return None
+            if not pinned:
+                votes = self._votes.setdefault(source, Counter())
+                votes[found[0]] += 1
+                if sum(votes.values()) >= self.sample_size:
+                    self._pinned[source] = votes.most_common(1)[0][0]
+                    del self._votes[source]
+
+        name, m = found
+        return TimestampMatch(source, m.group(1), (m.group(2) or "").strip(), name)
+
+    def match_lines(self, lines: Iterable[str]) -> list[TimestampMatch | None]:
+        return [self.match(line) for line in lines]
+
+    def to_datetime(self, match: TimestampMatch) -> datetime | None:
+        return to_datetime(match.timestamp, match.format)
+
+
+# --- Compact per-line formats ---
+# A corpus keeps one byte per line instead of a TimestampMatch: 0 for no
+# timestamp, else the code of the format the line matched
+FORMAT_CODES = {name: code for code, name in enumerate(TIMESTAMP_FORMATS, start=1)}
+_FORMAT_NAMES = {code: name for name, code in FORMAT_CODES.items()}
+
+
+def format_code(match: TimestampMatch | None) -> int:
+    return FORMAT_CODES[match.format] if match else 0
+
+
+def match_format(line: str, code: int) -> TimestampMatch | None:
+    # The match for a line whose format code is known: one pattern, no voting
+    if not code:
+        return None
+    source, text = split_label(line.strip())
+    name = _FORMAT_NAMES[code]
+    m = TIMESTAMP_FORMATS[name].match(text.lstrip())
+    if not m:
+        return None
+    return TimestampMatch(source, m.group(1), (m.group(2) or "").strip(), name)
+
+
+def is_timestamp_only(match: TimestampMatch | None) -> bool:
+    # A timestamp with no event text after it carries nothing to classify
+    return match is not None and not match.message
+
+
+# --- Vectorized parsing for the timeline ---
+def syslog_years(matches: list[TimestampMatch]) -> dict[str | None, int]:
+    # Year for each source's syslog timestamps: the most common year among the
+    # dated timestamps of the same source, else the current year
+    dated: dict[str | None, Counter] = {}
+    for match in matches:
+        if match.format in ("iso8601", "datetime", "bracketed"):
+            dated.setdefault(match.source, Counter())[int(match.timestamp[:4])] += 1
+    current = datetime.now().year
+    return {match.source: dated[match.source].most_common(1)[0][0] if match.source in dated else current
+            for match in matches if match.format == "syslog"}
+
+
+def timestamp_column(matches: list[TimestampMatch]):
+    # datetime64[ns] column (naive UTC) for a list of matches. Rows are parsed in
+    # bulk per (source, format) so offsets are resolved once per group; dateutil
+    # only sees the leftovers the vectorized pass could not parse. Both passes
+    # give syslog timestamps the same year (syslog_years).
+    import numpy as np
+    import pandas as pd
+    from dateutil import parser as dtparser
+
+    column = np.full(len(matches), np.datetime64("NaT"), dtype="datetime64[ns]")
+    years = syslog_years(matches)
+
+    groups: dict[tuple[str | None, str], list[int]] = {}
+    for i, match in enumerate(matches):
+        groups.setdefault((match.source, match.format), []).append(i)
+
+    for (source, fmt), rows in groups.items():
+        values = pd.Series([matches[i].timestamp for i in rows])
+        if fmt == "syslog":
+            values = f"{years[source]} " + values
+        if fmt == "epoch":
+            parsed = pd.to_datetime(pd.to_numeric(values, errors="coerce"), unit="s", errors="coerce")
+        else:
+            # Values without an offset are taken as UTC, the rest converted to it
+            parsed = pd.to_datetime(values, format=_PANDAS_FORMATS[fmt], utc=True, errors="coerce")
+            parsed = parsed.dt.tz_localize(None)
+        column[rows] = parsed.to_numpy(dtype="datetime64[ns]")
+
+    for i in np.flatnonzero(np.isnat(column)):
+        match = matches[i]
+        default = datetime(years[match.source], 1, 1) if match.format == "syslog" else None
+        try:
+            ts = dtparser.parse(match.timestamp, default=default)
+        except (ValueError, OverflowError):
+            continue
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        column[i] = np.datetime64(ts, "ns")
+
+    return column
@@ -0,0 +1,237 @@
+# token_budget.py
+
+import os
+import re
+import threading
+from typing import NamedTuple
+
+
+class ModelLimits(NamedTuple):
+    context: int     # tokens the model accepts, prompt and completion together
+    max_output: int  # largest completion the provider allows
+
+
+MODEL_LIMITS = {
+    "llama-3.3-70b-versatile": ModelLimits(context=131072, max_output=32768),
+}
+DEFAULT_MODEL = "llama-3.3-70b-versatile"
+
+# Overrides the context window, e.g. to stay under a provider's per-request cap
+CONTEXT_OVERRIDE = int(os.getenv("FORENSIQ_CONTEXT_TOKENS", "0"))
+# Counting tokenizer: a Hugging Face repo id, a local directory, or a vendored
+# tokenizer.json. Any tokenizer of the model's family will do; the default is
+# an ungated copy of Llama 3.3's (meta-llama's own repo needs an access token).
+TOKENIZER_NAME = os.getenv("FORENSIQ_TOKENIZER", "unsloth/Llama-3.3-70B-Instruct")
+
+# Chat template framing added around each message
+MESSAGE_OVERHEAD = 8
+# Share of the input budget the RAG context may use; logs get the rest
+RAG_SHARE = 0.25
+# Length estimate used when no tokenizer is loaded, built to count high: one
+# token per group of up to three digits (Llama 3 splits numbers that way, so
+# timestamps and IPs run under two characters per token), per three letters,
+# per whitespace run and per other character, plus one per extra UTF-8 byte
+_ESTIMATE_RE = re.compile(r"\d{1,3}|[A-Za-z]{1,3}|\s+|.", re.DOTALL)
+
+# Lines worth keeping first when logs have to be cut
+_HIGH_VALUE_RE = re.compile(
+    r"(?i)\b(?:critical|fatal|alert|emerg\w*|attack|malware|exploit|breach|unauthori[sz]ed|denied|forbidden"
+    r"|fail(?:ed|ure)?|error|exception|sudo|privilege\w*)\b")
+_MEDIUM_VALUE_RE = re.compile(r"(?i)\b(?:warn\w*|timeout|timed out|refused|invalid|reset|blocked|retry\w*)\b")
+
+
+class PromptTooLarge(ValueError):
+    pass
+
+
+# --- Counting ---
+_tokenizer_lock = threading.Lock()
+_tokenizer_loader: threading.Thread | None = None
+_loaded_tokenizer = None
+_estimate_logged = False
+
+
+def load_tokenizer():
+    # Local files first; the network only when the tokenizer is not cached yet
+    from transformers import AutoTokenizer, PreTrainedTokenizerFast
+    if os.path.isfile(TOKENIZER_NAME):
+        return PreTrainedTokenizerFast(tokenizer_file=TOKENIZER_NAME)
+    try:
+        return AutoTokenizer.from_pretrained(TOKENIZER_NAME, local_files_only=True)
+    except Exception:
+        return AutoTokenizer.from_pretrained(TOKENIZER_NAME)
+
+
+def _load_in_background():
+    global _loaded_tokenizer
+    try:
+        _loaded_tokenizer = load_tokenizer()
+        print(f"[TOKENS] Counting with the {TOKENIZER_NAME} tokenizer")
+    except Exception as e:
+        print(f"[TOKENS] Tokenizer {TOKENIZER_NAME} unavailable, estimating from length: {e}")
+
+
+def warm_tokenizer():
+    # Starts loading the tokenizer off the request path; safe to call repeatedly
+    global _tokenizer_loader
+    with _tokenizer_lock:
+        if _tokenizer_loader is None:
+            _tokenizer_loader = threading.Thread(target=_load_in_background, name="tokenizer-loader", daemon=True)
+            _tokenizer_loader.start()
+
+
+def _tokenizer():
+    # The tokenizer once loaded; until then (or if it cannot load) None, and
+    # counts fall back to a length estimate that errs on the large side
+    global _estimate_logged
+    if _loaded_tokenizer is not None:
+        return _loaded_tokenizer
+    warm_tokenizer()
+    if not _estimate_logged and _tokenizer_loader.is_alive():
+        _estimate_logged = True
+        print("[TOKENS] Tokenizer still loading; estimating from length meanwhile")
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_ESTIMATE_RE.findall(text)) + len(text.encode("utf-8")) - len(text)
+
+
+def count_tokens(text: str) -> int:
+    tokenizer = _tokenizer()
+    if tokenizer is None:
+        return estimate_tokens(text)
+    return len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def count_tokens_lines(lines: list[str]) -> list[int]:
+    # One batched call instead of a tokenizer round trip per line
+    tokenizer = _tokenizer()
+    if tokenizer is None:
+        return [estimate_tokens(line) for line in lines]
+    if not lines:
+        return []
+    return [len(ids) for ids in tokenizer(lines, add_special_tokens=False)["input_ids"]]
+
+
+def count_messages(messages: list[dict]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in messages)
+
+
+# --- Budgets ---
+def model_limits(model: str = DEFAULT_MODEL) -> ModelLimits:
+    limits = MODEL_LIMITS.get(model, MODEL_LIMITS[DEFAULT_MODEL])
+    if CONTEXT_OVERRIDE:
+        limits = limits._replace(context=CONTEXT_OVERRIDE)
+    return limits
+
+
+def check_request(messages: list[dict], max_output: int, model: str = DEFAULT_MODEL) -> int:
+    # Refuse locally rather than let the provider reject an oversized request
+    limits = model_limits(model)
+    used = count_messages(messages)
+    if max_output > limits.max_output or used + max_output > limits.context:
+        raise PromptTooLarge(
+            f"Request needs {used} prompt + {max_output} output tokens; "
+            f"{model} allows {limits.context} total and {limits.max_output} output")
+    return used
+
+
+# --- Packing ---
+def line_value(line: str) -> int:
+    if _HIGH_VALUE_RE.search(line):
+        return 2
+    if _MEDIUM_VALUE_RE.search(line):
+        return 1
+    return 0
+
+
+def pack_lines(lines: list[str], budget: int, values: list[float] | None = None,
+               max_items: int | None = None) -> tuple[list[str], int]:
+    # Highest-value lines first (earlier lines win ties) until the budget is
+    # spent; the kept lines come back in their original order. Returns the
+    # kept lines and the tokens they use, one newline each included.
+    tokens = count_tokens_lines(lines)
+    total = sum(tokens) + len(lines)
+    if total <= budget and (max_items is None or len(lines) <= max_items):
+        return lines, total
+
+    values = values or [line_value(line) for line in lines]
+    keep = []
+    used = 0
+    for i in sorted(range(len(lines)), key=lambda i: (-values[i], i)):
+        if max_items is not None and len(keep) >= max_items:
+            break
+        cost = tokens[i] + 1
+        if used + cost <= budget:
+            keep.append(i)
+            used += cost
+    keep.sort()
+    return [lines[i] for i in keep], used
+
+
+def text_tokens(text: str) -> int:
+    # Counted the way truncate_text counts: per line, plus one per newline
+    lines = text.splitlines()
+    return sum(count_tokens_lines(lines)) + len(lines)
+
+
+def truncate_text(text: str, budget: int) -> tuple[str, int]:
+    # Leading whole lines of text within budget (RAG hits and feedback notes
+    # arrive most relevant first); returns the text and its token count
+    lines = text.splitlines()
+    tokens = count_tokens_lines(lines)
+    kept = 0
+    used = 0
+    for cost in tokens:
+        if used + cost + 1 > budget:
+            break
+        used += cost + 1
+        kept += 1
+    return "\n".join(lines[:kept]), used
+
+
+class PackedPrompt(NamedTuple):
+    logs: list[str]
+    rag_context: str
+    feedback_notes: str
+    report: dict
+
+
+def pack_prompt(fixed_messages: list[dict], log_lines: list[str], rag_context: str = "",
+                feedback_notes: str = "", max_output: int = 0, model: str = DEFAULT_MODEL,
+                values: list[float] | None = None) -> PackedPrompt:
+    # Fits the variable parts of a request into what the model leaves after the
+    # fixed messages and the output reservation. Feedback notes go in first,
+    # RAG context may take up to RAG_SHARE of what is left, logs fill the rest
+    # (by values when given, e.g. triage scores; otherwise by line_value).
+    limits = model_limits(model)
+    fixed = count_messages(fixed_messages)
+    available = limits.context - max_output - fixed
+    if available <= 0:
+        raise PromptTooLarge(
+            f"Instructions ({fixed} tokens) and output reservation ({max_output}) exceed {model}'s {limits.context}")
+
+    feedback_total = text_tokens(feedback_notes)
+    feedback_notes, feedback_used = truncate_text(feedback_notes, available) if feedback_notes else ("", 0)
+    available -= feedback_used
+
+    rag_total = text_tokens(rag_context)
+    rag_context, rag_used = truncate_text(rag_context, int(available * RAG_SHARE)) if rag_context else ("", 0)
+    available -= rag_used
+
+    kept, logs_used = pack_lines(log_lines, available, values)
+
+    report = {
+        "model": model,
+        "context_tokens": limits.context,
+        "reserved_output_tokens": max_output,
+        "prompt_tokens": fixed + feedback_used + rag_used + logs_used,
+        "logs_kept": len(kept),
+        "logs_dropped": len(log_lines) - len(kept),
+        "rag_tokens_dropped": max(rag_total - rag_used, 0),
+        "feedback_tokens_dropped": max(feedback_total - feedback_used, 0),
+    }
+    if report["logs_dropped"] or report["rag_tokens_dropped"] or report["feedback_tokens_dropped"]:
+        print(f"[TOKENS] Packed prompt to budget: {report}")
+    return PackedPrompt(kept, rag_context, feedback_notes, report)